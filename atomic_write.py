@@ -0,0 +1,116 @@
+# Shared way for all of the tools to write their output files
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+
+# Two things can go wrong when a tool just opens the output file and writes to it:
+#
+# * If nothing actually changed, the file still gets a new modification time,
+#   so make (or watch.py, or anything else that goes by modification times)
+#   thinks everything that uses it is out of date, all the way up to the ROM.
+# * If the tool gets interrupted partway through, it leaves behind half of a
+#   .dat file, which looks up to date next time.
+#
+# So the new data goes to a temporary file next to the output, which then
+# replaces the output in one step, and only if it's different from what's
+# already there. Files get compared by size first, and then by hash.
+
+CHUNK_SIZE = 1 << 20
+
+# How many files have been written and left alone since the process started
+written = 0
+unchanged = 0
+
+def stats():
+    # Returns (files written, files left unchanged)
+    return (written, unchanged)
+
+def format_stats(written, unchanged):
+    return f'{written} {"file" if written == 1 else "files"} written, {unchanged} unchanged'
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.digest()
+
+def is_same(path, size, digest):
+    # `digest` is a function, so nothing gets hashed unless the sizes match
+    try:
+        if os.path.getsize(path) != size:
+            return False
+        return file_digest(path) == digest()
+    except FileNotFoundError:
+        return False
+
+def temp_path(path):
+    # Next to the output, so os.replace never has to move it to another drive.
+    # The process ID keeps batch.py's workers from using the same name
+    return f'{path}.{os.getpid()}.tmp'
+
+def _count(changed):
+    global written, unchanged
+    if changed:
+        written += 1
+    else:
+        unchanged += 1
+    return changed
+
+def write(path, data):
+    # Writes `data` (bytes, a bytearray or a memoryview) to `path`, unless the
+    # file already has exactly that data. Returns whether it wrote the file
+    if is_same(path, len(data), lambda: hashlib.sha256(data).digest()):
+        return _count(False)
+
+    tmp = temp_path(path)
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+    return _count(True)
+
+def write_json(path, structured, indent=4):
+    # Same formatting that the tools have always used for their JSON files
+    return write(path, json.dumps(structured, ensure_ascii=False, indent=indent).encode('utf-8'))
+
+def write_png(path, image):
+    # A PIL image has to be saved before there's anything to compare
+    out = io.BytesIO()
+    image.save(out, format='PNG')
+    return write(path, out.getbuffer())
+
+@contextlib.contextmanager
+def open_output(path, mode='wb'):
+    # For output that gets written a piece at a time, instead of all at once.
+    # Gives a file object for a temporary file, which replaces `path` at the
+    # end of the `with` block if it's different. If anything goes wrong
+    # before then, the temporary file gets deleted and `path` is left alone
+    tmp = temp_path(path)
+    try:
+        with open(tmp, mode) as f:
+            yield f
+        if is_same(path, os.path.getsize(tmp), lambda: file_digest(tmp)):
+            os.remove(tmp)
+            _count(False)
+        else:
+            os.replace(tmp, path)
+            _count(True)
+    except:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
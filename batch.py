@@ -0,0 +1,205 @@
+# Script to rebuild every .dat file in a rules file at once, using all of the CPU's cores
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import concurrent.futures
+import json
+from multiprocessing import shared_memory
+import os
+import sys
+import time
+import traceback
+
+import atomic_write
+import watch
+
+# Backgrounds and fonts are slow enough to be worth doing in another process.
+# Everything else is done in this process, like watch.py does it
+# (Each of these writes exactly one file)
+PARALLEL_COMMANDS = {('bg_files', 'insert-img'), ('bg_files', 'compress'), ('font', 'make')}
+
+def share(path):
+    # Copies a file into a shared memory block, so worker processes can read it
+    # without it getting pickled and sent to them. Returns the block, which has
+    # to be closed and unlinked after the worker is done with it
+    size = os.path.getsize(path)
+    # Shared memory blocks can't be empty
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    with open(path, 'rb') as f:
+        f.readinto(block.buf[:size])
+    return (block, size)
+
+def run_bg_insert_img(inputs, flags):
+    import bg_files
+    import raw_image
+
+    compress = True
+    for flag in flags:
+        if flag == '--no-compress':
+            compress = False
+        elif not flag.startswith('--jobs='):
+            raise ValueError(f'Unknown option {flag}')
+    (bg_dat, edited) = inputs
+    if raw_image.is_raw(edited):
+        return bg_files.replace_raw(bg_dat, edited, compress)
+    with bg_files.open_png(edited) as image:
+        return bg_files.replace_image(bg_dat, image, compress)
+
+def run_bg_compress(inputs, flags):
+    import bg_files
+
+    fmt = b'AT6P'
+    for flag in flags:
+        if flag.startswith('--format='):
+            fmt = flag[len('--format='):].upper().encode('ascii')
+        elif not flag.startswith('--jobs='):
+            raise ValueError(f'Unknown option {flag}')
+    return bg_files.compress(inputs[0], fmt)
+
+def run_font_make(inputs, flags):
+    import font
+
+    trim = False
+    width_gap = None
+    for flag in flags:
+        if flag == '--trim':
+            trim = True
+        elif flag.startswith('--trim-width='):
+            trim = True
+            width_gap = int(flag[len('--trim-width='):])
+        else:
+            raise ValueError(f'Unknown option {flag}')
+    (image_data, json_data) = inputs
+    structured = font.parse_edited_font(image_data, json.loads(bytes(json_data).decode('utf-8')))
+    if trim:
+        font.trim_glyphs(structured['chars'], width_gap)
+    return font.make_sir0_from_dict(structured)
+
+RUNNERS = {
+    ('bg_files', 'insert-img'): run_bg_insert_img,
+    ('bg_files', 'compress'): run_bg_compress,
+    ('font', 'make'): run_font_make,
+}
+
+def run_job(tool, command, handles, flags, output):
+    # Runs in a worker process. `handles` is a list of (shared memory block
+    # name, size) for each input. The worker writes the output file itself, so
+    # the only things that go back to the main process are how long it took
+    # and whether the output changed
+    start = time.perf_counter()
+    blocks = [shared_memory.SharedMemory(name=name) for (name, _) in handles]
+    views = [block.buf[:size] for (block, (_, size)) in zip(blocks, handles)]
+    error = None
+    try:
+        result = RUNNERS[(tool, command)](views, flags)
+    except Exception as e:
+        # The traceback's frames still hold slices of the shared memory, and
+        # the blocks can't be closed while those exist, so let go of them
+        # first. Otherwise close() fails and hides what actually went wrong
+        error = e
+        # Keep the traceback as text, so the main process can still show it
+        error.worker_traceback = traceback.format_exc()
+        while e is not None:
+            e.__traceback__ = None
+            e = e.__context__
+    for view in views:
+        view.release()
+    del views
+    for block in blocks:
+        block.close()
+    if error is not None:
+        raise error
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    written = atomic_write.write(output, result)
+    return ((time.perf_counter() - start) * 1000, written)
+
+def build(rules, jobs=None):
+    # Builds every rule, in order, except that rules done in worker processes
+    # run at the same time as everything after them, until something needs
+    # their output. Returns (how many rules failed, how many outputs didn't
+    # need to be rewritten because they didn't change)
+    failures = 0
+    (_, unchanged_before) = atomic_write.stats()
+    worker_unchanged = 0
+    # Output path -> (future, rule, shared memory blocks)
+    running = {}
+
+    def finish(output):
+        nonlocal failures, worker_unchanged
+        (future, rule, blocks) = running.pop(output)
+        try:
+            (elapsed, written) = future.result()
+            if written:
+                print(f'Rebuilt {rule.name} in {elapsed:.0f} ms (in a worker process)')
+            else:
+                print(f'Rebuilt {rule.name} in {elapsed:.0f} ms, but it didn\'t change (in a worker process)')
+                worker_unchanged += 1
+        except Exception as e:
+            print(f'FAILED to rebuild {rule.name} (rule on line {rule.line_number}): {type(e).__name__}: {e}')
+            if hasattr(e, 'worker_traceback'):
+                print(e.worker_traceback, end='')
+            failures += 1
+        finally:
+            for block in blocks:
+                # Unlink every block even if closing one fails, so a failed
+                # worker doesn't leave the rest of them behind in shared memory
+                try:
+                    block.close()
+                except BufferError as e:
+                    print(f'Could not close shared memory for {rule.name}: {e}')
+                finally:
+                    block.unlink()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        try:
+            for rule in rules:
+                for path in rule.inputs:
+                    if path in running:
+                        finish(path)
+
+                if (rule.tool, rule.command) in PARALLEL_COMMANDS:
+                    shared = [share(path) for path in rule.inputs]
+                    handles = [(block.name, size) for (block, size) in shared]
+                    (output,) = rule.outputs
+                    future = executor.submit(run_job, rule.tool, rule.command, handles, rule.flags, output)
+                    running[output] = (future, rule, [block for (block, _) in shared])
+                else:
+                    if rule.tool not in sys.modules:
+                        __import__(rule.tool)
+                    if not watch.rebuild(rule):
+                        failures += 1
+        finally:
+            for output in list(running.keys()):
+                finish(output)
+    (_, unchanged) = atomic_write.stats()
+    return (failures, unchanged - unchanged_before + worker_unchanged)
+
+def print_usage(args):
+    print('Usage:')
+    print(f'    python {args[0]} <rules.txt> [--jobs=<n>]')
+
+def main(args):
+    if len(args) < 2:
+        print_usage(args)
+        return 1
+
+    jobs = None
+    for arg in args[2:]:
+        if arg.startswith('--jobs='):
+            jobs = int(arg[len('--jobs='):]) or None
+        else:
+            print_usage(args)
+            return 1
+
+    rules = watch.read_rules(args[1])
+    start = time.perf_counter()
+    (failures, unchanged) = build(rules, jobs)
+    built = len(rules) - failures
+    print(f'Built {built} of {len(rules)} files in {time.perf_counter() - start:.1f} s ({atomic_write.format_stats(built - unchanged, unchanged)})')
+    return 1 if failures != 0 else 0
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
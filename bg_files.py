@@ -1,12 +1,19 @@
 # BG.dat image extraction/insertion script
 # for 999: Nine Hours, Nine Persons, Nine Doors (DS)
 # by PhoenixBound
-# Last updated: 2025-03-21
+# Last updated: 2026-10-19
 
-# import json
+import bisect
+import io
+import json
 import sys
+import zlib
 
-from PIL import Image
+import atomic_write
+import raw_image
+
+# Pillow isn't imported here: it takes longer to import than decompressing or
+# compressing a background takes, so only the functions that use images import it
 
 def read_str(data, offset):
     end_index = data.find(0, offset)
@@ -26,7 +33,19 @@ def to_encoded_display_str(s, encoding):
         encoding = 'mskanji'
     return s.encode(encoding) + b'\0'
 
-def at6p_decompress(data):
+# AT6P streams start with the first byte of output, and then a stream of bits
+# that encode the difference between each byte and the one before it
+AT6P_BITS_START = 0x16 * 8
+# How often (in output bytes) a checkpoint gets saved when building an index
+AT6P_CHECKPOINT_INTERVAL = 0x1000
+AT6P_INDEX_VERSION = 1
+# How much data each process encodes at once, when compressing in parallel
+AT6P_PARALLEL_CHUNK_SIZE = 0x8000
+# How much decompressed data the streaming functions handle at once
+STREAM_CHUNK_SIZE = 0x10000
+
+def at6p_check_header(data):
+    # Returns the decompressed size
     assert data[0:4] == b'AT6P'
     unk = data[4]
     compressed_size = int.from_bytes(data[5:7], 'little')
@@ -34,19 +53,23 @@ def at6p_decompress(data):
     # assert int.from_bytes(data[7:16], 'little') == 0
     decompressed_size = int.from_bytes(data[16:19], 'little')
     assert data[19] == 0
-    
-    previous = data[20]
-    current = previous
-    
-    output = bytearray()
-    output.append(current)
-    
     # assert data[21] == 0
+    return decompressed_size
+
+def at6p_decode(data, state, end, output, checkpoints=None, interval=AT6P_CHECKPOINT_INTERVAL):
+    # Decodes bytes onto the end of `output`, until the output position gets
+    # to `end`. `state` is (bit offset in `data`, current byte, previous byte,
+    # output position). Returns the state after the last byte.
+    #
+    # If `checkpoints` is a list, the state gets added to it every time the
+    # output position is a multiple of `interval`
+    (bit_offset, current, previous, out_pos) = state
+    i_byte = bit_offset >> 3
+    i_bit = bit_offset & 7
     
-    i_byte = 0x16
-    i_bit = 0
-    
-    while len(output) < decompressed_size:
+    while out_pos < end:
+        if checkpoints is not None and out_pos % interval == 0:
+            checkpoints.append((i_byte * 8 + i_bit, current, previous, out_pos))
         bit_count = 0
         while (data[i_byte] >> i_bit) & 1 == 0:
             bit_count += 1
@@ -87,10 +110,145 @@ def at6p_decompress(data):
             current += magnitude * sign
             current &= 0xFF
         output.append(current)
+        out_pos += 1
+    
+    return (i_byte * 8 + i_bit, current, previous, out_pos)
+
+def at6p_iter_decompress(data, chunk_size=STREAM_CHUNK_SIZE, checkpoints=None, interval=AT6P_CHECKPOINT_INTERVAL):
+    # Yields the decompressed data `chunk_size` bytes at a time, so the whole
+    # thing never has to be in memory at once. If `checkpoints` is a list, it
+    # gets filled in with an index that at6p_decompress_range can use
+    decompressed_size = at6p_check_header(data)
+    
+    first = data[20]
+    state = (AT6P_BITS_START, first, first, 1)
+    if checkpoints is not None:
+        # The state right after the first byte, so that every position has a
+        # checkpoint before it
+        checkpoints.append(state)
     
+    output = bytearray()
+    output.append(first)
+    while True:
+        state = at6p_decode(data, state, min(state[3] + chunk_size - len(output), decompressed_size),
+                            output, checkpoints, interval)
+        yield output
+        if state[3] >= decompressed_size:
+            break
+        output = bytearray()
+
+def at6p_decompress(data, checkpoints=None, interval=AT6P_CHECKPOINT_INTERVAL):
+    output = bytearray()
+    for chunk in at6p_iter_decompress(data, STREAM_CHUNK_SIZE, checkpoints, interval):
+        output += chunk
     return output
 
-def at6p_compress(data):
+def at6p_decompress_range(data, start, end, checkpoints=None):
+    # Returns decompressed bytes [start, end), decoding from the closest
+    # checkpoint before `start` instead of from the beginning
+    decompressed_size = at6p_check_header(data)
+    end = min(end, decompressed_size)
+    if start >= end:
+        return bytearray()
+    
+    first = data[20]
+    state = (AT6P_BITS_START, first, first, 1)
+    if checkpoints:
+        i = bisect.bisect_right(checkpoints, max(start, 1), key=lambda c: c[3]) - 1
+        if i >= 0:
+            state = tuple(checkpoints[i])
+    
+    output = bytearray()
+    output_start = state[3]
+    if start == 0:
+        output.append(first)
+        output_start = 0
+    at6p_decode(data, state, end, output)
+    
+    return output[start - output_start:]
+
+def save_at6p_index(path, data, checkpoints):
+    # The index remembers which file it was made for, so it doesn't get used
+    # with a different version of the file by accident
+    atomic_write.write_json(path, {
+        'version': AT6P_INDEX_VERSION,
+        'size': len(data),
+        'crc32': zlib.crc32(data),
+        'checkpoints': checkpoints,
+    }, indent=None)
+
+def load_at6p_index(path, data):
+    # Returns the checkpoints, or None if there's no index for this exact file
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    if index.get('version') != AT6P_INDEX_VERSION or index['size'] != len(data) or index['crc32'] != zlib.crc32(data):
+        return None
+    return [tuple(c) for c in index['checkpoints']]
+
+def exp_golomb_code(word):
+    # Encodes the word as bits, using the method mentioned on the
+    # "exponential-golomb" Wikipedia page. Returns (bits, bit count), with the
+    # first bit in the stream as the lowest bit: some 0 bits, then a 1, then
+    # the rest of the number's bits, least significant first
+    word += 1
+    length = word.bit_length() - 1
+    return ((1 << length) | ((word - (1 << length)) << (length + 1)), length * 2 + 1)
+
+# Words only go up to 2*128 + 1, so every possible code can be looked up
+EXP_GOLOMB_CODES = [exp_golomb_code(word) for word in range(258)]
+
+def at6p_previous_before(data, start):
+    # The `previous` byte that the encoder has when it gets to data[start].
+    # It only changes when a byte is different from the one before it, so it
+    # only depends on the input, not on anything the encoder did
+    for i in range(start - 1, 0, -1):
+        if data[i] != data[i - 1]:
+            return data[i - 1]
+    return data[0]
+
+def at6p_encode_chunk(data, start, end, previous, last=None):
+    # Encodes data[start:end]. `last` is the byte before it (by default,
+    # data[start - 1]). Returns (encoded bits as bytes, number of bits,
+    # `previous` afterwards)
+    output = bytearray()
+    bits = 0
+    bit_count = 0
+    codes = EXP_GOLOMB_CODES
+    
+    if last is None:
+        last = data[start - 1]
+    for i in range(start, end):
+        b = data[i]
+        delta = b - last
+        # Make signed
+        delta = ((delta + 0x80) & 0xFF) - 0x80
+        
+        if delta == 0:
+            word = 0
+        elif b == previous:
+            word = 1
+            previous = last
+        else:
+            word = abs(delta) * 2 + int(delta < 0)
+            previous = last
+        last = b
+        
+        (code, length) = codes[word]
+        bits |= code << bit_count
+        bit_count += length
+        if bit_count >= 32:
+            output.extend((bits & 0xFFFFFFFF).to_bytes(4, 'little'))
+            bits >>= 32
+            bit_count -= 32
+    
+    total_bits = len(output) * 8 + bit_count
+    output.extend(bits.to_bytes((bit_count + 7) // 8, 'little'))
+    return (output, total_bits, previous)
+
+def at6p_header(decompressed_size, first_byte):
     output = bytearray()
     output.extend(b'AT6P')
     # I dunno how to calculate this. I originally put an F (for "frustrating" of course...)
@@ -99,71 +257,317 @@ def at6p_compress(data):
     # Placeholder: compressed size
     output.extend(b'\x00\x00')
     output.extend(b'\x00' * 9)
-    output.extend(len(data).to_bytes(3, 'little'))
+    output.extend(decompressed_size.to_bytes(3, 'little'))
     output.append(0)
-    output.append(data[0])
+    output.append(first_byte)
     output.append(0)
+    return output
+
+def at6p_splice(output, fragments):
+    # Adds bit streams onto the end of `output`, one right after the other,
+    # even if they don't end on a byte boundary
+    bits = 0
+    bit_count = 0
+    for (fragment, fragment_bits) in fragments:
+        if bit_count != 0:
+            fragment = (bits | (int.from_bytes(fragment, 'little') << bit_count)).to_bytes((bit_count + fragment_bits + 7) // 8, 'little')
+        bit_count = (bit_count + fragment_bits) % 8
+        if bit_count != 0:
+            # Keep the unfinished last byte out, to add the next fragment onto
+            output.extend(memoryview(fragment)[:-1])
+            bits = fragment[-1]
+        else:
+            output.extend(fragment)
+            bits = 0
+    if bit_count != 0:
+        output.append(bits)
+    return output
+
+class Compressor:
+    # Compresses AT6P data one piece at a time: call feed() with each piece,
+    # then finish() to get the compressed file. Only the compressed data is
+    # kept, and that can't be more than 64 KiB anyway (the size is 16 bits)
+    def __init__(self):
+        self.size = 0
+        self.first = None
+        self.last = None
+        self.previous = None
+        self.fragments = []
     
-    compressed_byte = 0
-    compressed_bit_pos = 0
+    def feed(self, data):
+        if len(data) == 0:
+            return
+        start = 0
+        if self.first is None:
+            # The first byte goes in the header instead of the bit stream
+            self.first = self.last = self.previous = data[0]
+            start = 1
+        (fragment, fragment_bits, self.previous) = at6p_encode_chunk(data, start, len(data), self.previous, self.last)
+        self.fragments.append((fragment, fragment_bits))
+        self.last = data[-1]
+        self.size += len(data)
     
-    previous = data[0]
+    def feed_file(self, f, chunk_size=STREAM_CHUNK_SIZE):
+        while chunk := f.read(chunk_size):
+            self.feed(chunk)
     
-    for (i, b) in zip(range(1, len(data)), data[1:]):
-        delta = b - data[i - 1]
-        # Make signed
-        delta = ((delta + 0x80) & 0xFF) - 0x80
-        sign_bit = int(delta < 0)
-        magnitude = abs(delta)
+    def finish(self):
+        if self.first is None:
+            # The header needs the first byte
+            raise RuntimeError('Nothing to compress -- AT6P data has to be at least 1 byte long')
+        output = at6p_header(self.size, self.first)
+        at6p_splice(output, self.fragments)
+        self.fragments = []
         
-        word = None
-        if magnitude == 0:
-            word = 0
-        elif b == previous:
-            word = 1
-            previous = data[i - 1]
-        else:
-            word = magnitude * 2 + sign_bit
-            previous = data[i - 1]
-
-        # Encode the word as bits, using the method mentioned on the "exponential-golomb"
-        # Wikipedia page
-        word += 1
+        # Fill in the compressed size, now that we know it
+        output[5:7] = len(output).to_bytes(2, 'little')
         
-        # Add initial 0 bits
-        for j in range(word.bit_length() - 1):
-            # compressed_byte |= 0
-            compressed_bit_pos += 1
-            if compressed_bit_pos == 8:
-                compressed_bit_pos = 0
-                output.append(compressed_byte)
-                compressed_byte = 0
-        # Then add data bits
-        # Starting with the initial 1
-        compressed_byte |= 1 << compressed_bit_pos
-        compressed_bit_pos += 1
-        if compressed_bit_pos == 8:
-            compressed_bit_pos = 0
-            output.append(compressed_byte)
-            compressed_byte = 0
-        # Then proceeding through the number with all the least significant bits
-        for j in range(word.bit_length() - 1):
-            compressed_byte |= ((word >> j) & 1) << compressed_bit_pos
-            compressed_bit_pos += 1
-            if compressed_bit_pos == 8:
-                compressed_bit_pos = 0
-                output.append(compressed_byte)
-                compressed_byte = 0
-                
-    if compressed_bit_pos != 0:
-        output.append(compressed_byte)
+        # return bytes(output)
+        return output
+
+def at6p_compress(data):
+    compressor = Compressor()
+    compressor.feed(data)
+    return compressor.finish()
+
+def at6p_encode_job(job):
+    # Runs in a worker process. `chunk` starts with the byte before the part
+    # that actually gets encoded
+    (chunk, previous) = job
+    (fragment, fragment_bits, _) = at6p_encode_chunk(chunk, 1, len(chunk), previous)
+    return (fragment, fragment_bits)
+
+def at6p_compress_parallel(data, jobs=None, chunk_size=AT6P_PARALLEL_CHUNK_SIZE):
+    # Same output as at6p_compress, but different parts of the data get encoded
+    # at the same time in separate processes, and then get stuck together
+    if len(data) <= chunk_size * 2 or jobs == 1:
+        return at6p_compress(data)
     
-    # Fill in the compressed size, now that we know it
+    import concurrent.futures
+    
+    starts = list(range(1, len(data), chunk_size))
+    work = [(bytes(data[start - 1:start + chunk_size]), at6p_previous_before(data, start)) for start in starts]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        fragments = list(executor.map(at6p_encode_job, work))
+    
+    output = at6p_header(len(data), data[0])
+    at6p_splice(output, fragments)
     output[5:7] = len(output).to_bytes(2, 'little')
+    return output
+
+# The other compression formats (AT3P, AT4P, AT5P) seem to be the same "PX"
+# LZ compression as in Chunsoft's Pokemon Mystery Dungeon games. I'm assuming
+# they use the same header as AT6P: magic, an unknown byte, u16 compressed
+# size, 9 bytes of "control flags", u32 decompressed size, then the data
+PX_FORMATS = (b'AT3P', b'AT4P', b'AT5P')
+PX_DATA_START = 0x14
+# Back-references can reach this far back
+PX_WINDOW = 0x1000
+PX_MIN_MATCH = 3
+PX_MAX_MATCH = 18
+
+def px_decompress(data):
+    assert data[0:4] in PX_FORMATS
+    compressed_size = int.from_bytes(data[5:7], 'little')
+    assert compressed_size == len(data)
+    # A copy, since memoryviews (from nitrofs.py or shared memory) can't find()
+    flags = bytes(data[7:16])
+    decompressed_size = int.from_bytes(data[16:20], 'little')
+    
+    output = bytearray()
+    i = PX_DATA_START
+    while len(output) < decompressed_size and i < len(data):
+        control = data[i]
+        i += 1
+        for bit in range(7, -1, -1):
+            if len(output) >= decompressed_size or i >= len(data):
+                break
+            if (control >> bit) & 1:
+                # Literal byte
+                output.append(data[i])
+                i += 1
+                continue
+            
+            high = data[i] >> 4
+            low = data[i] & 0xF
+            i += 1
+            flag_index = flags.find(high)
+            if flag_index != -1:
+                # Two bytes made of 4 nybbles that are (almost) all the same
+                if flag_index == 0:
+                    output.append(low * 0x11)
+                    output.append(low * 0x11)
+                else:
+                    nybble = low
+                    if flag_index == 1:
+                        nybble += 1
+                    elif flag_index == 5:
+                        nybble -= 1
+                    nybbles = [nybble] * 4
+                    if flag_index <= 4:
+                        nybbles[flag_index - 1] -= 1
+                    else:
+                        nybbles[flag_index - 5] += 1
+                    output.append(((nybbles[0] << 4) | nybbles[1]) & 0xFF)
+                    output.append(((nybbles[2] << 4) | nybbles[3]) & 0xFF)
+                continue
+            
+            # Back-reference: copy earlier output
+            distance = PX_WINDOW - ((low << 8) | data[i])
+            i += 1
+            length = high + PX_MIN_MATCH
+            start = len(output) - distance
+            if start < 0:
+                raise RuntimeError(f'PX back-reference at 0x{i - 2:X} points before the start of the data')
+            if distance >= length:
+                output += output[start:start+length]
+            else:
+                # The copy overlaps what it's creating, so it repeats the
+                # last `distance` bytes
+                pattern = output[start:]
+                output += (pattern * (length // distance + 1))[:length]
     
-    # return bytes(output)
+    del output[decompressed_size:]
     return output
 
+def px_find_match(data, i, candidates):
+    # Returns (length, distance) of the longest earlier copy of data[i:]
+    best_length = 0
+    best_distance = 0
+    limit = min(PX_MAX_MATCH, len(data) - i)
+    for candidate in reversed(candidates[-32:]):
+        distance = i - candidate
+        if distance > PX_WINDOW:
+            break
+        length = 0
+        while length < limit and data[candidate + length] == data[i + length]:
+            length += 1
+        if length > best_length:
+            (best_length, best_distance) = (length, distance)
+            if length == limit:
+                break
+    return (best_length, best_distance)
+
+def px_compress(data, fmt=b'AT5P'):
+    assert fmt in PX_FORMATS
+    # First, find the longest match at every point (greedily)
+    tokens = []
+    positions = {}
+    i = 0
+    while i < len(data):
+        key = bytes(data[i:i+PX_MIN_MATCH])
+        candidates = positions.setdefault(key, [])
+        (length, distance) = px_find_match(data, i, candidates) if len(key) == PX_MIN_MATCH else (0, 0)
+        if length >= PX_MIN_MATCH:
+            tokens.append((length, distance))
+            for j in range(i, i + length):
+                positions.setdefault(bytes(data[j:j+PX_MIN_MATCH]), []).append(j)
+            i += length
+        else:
+            tokens.append(None)
+            candidates.append(i)
+            i += 1
+    
+    # Lengths are stored in the high nybble, but 9 of the 16 possible values
+    # are taken by the control flags. Keep the 7 most used lengths (always
+    # including the shortest one, which any match can be cut down to)
+    counts = [0] * 16
+    for token in tokens:
+        if token is not None:
+            counts[token[0] - PX_MIN_MATCH] += 1
+    counts[0] = len(tokens) + 1
+    kept = sorted(range(16), key=lambda n: -counts[n])[:7]
+    flags = bytes(sorted(set(range(16)) - set(kept)))
+    allowed_lengths = sorted((n + PX_MIN_MATCH for n in kept), reverse=True)
+    
+    output = bytearray()
+    output.extend(fmt)
+    output.append(0)
+    # Placeholder: compressed size
+    output.extend(b'\x00\x00')
+    output.extend(flags)
+    output.extend(len(data).to_bytes(4, 'little'))
+    
+    control_index = None
+    control_bit = 0
+    i = 0
+    def start_item(literal):
+        nonlocal control_index, control_bit
+        if control_bit == 0:
+            control_index = len(output)
+            output.append(0)
+            control_bit = 8
+        control_bit -= 1
+        if literal:
+            output[control_index] |= 1 << control_bit
+    
+    for token in tokens:
+        if token is None:
+            start_item(True)
+            output.append(data[i])
+            i += 1
+            continue
+        (length, distance) = token
+        while length > 0:
+            # Use the longest allowed length that fits, and literals for any
+            # last bytes that are too short for a match
+            usable = next((n for n in allowed_lengths if n <= length), None)
+            if usable is None:
+                for _ in range(length):
+                    start_item(True)
+                    output.append(data[i])
+                    i += 1
+                break
+            start_item(False)
+            encoded_distance = PX_WINDOW - distance
+            output.append(((usable - PX_MIN_MATCH) << 4) | (encoded_distance >> 8))
+            output.append(encoded_distance & 0xFF)
+            i += usable
+            length -= usable
+    
+    # Fill in the compressed size, now that we know it
+    output[5:7] = len(output).to_bytes(2, 'little')
+    return output
+
+COMPRESSED_FORMATS = (b'AT6P',) + PX_FORMATS
+
+def is_compressed(data):
+    return data[0:4] in COMPRESSED_FORMATS
+
+def decompress(data):
+    # Decompresses any of the formats, based on the first 4 bytes
+    magic = bytes(data[0:4])
+    if magic == b'AT6P':
+        return at6p_decompress(data)
+    if magic in PX_FORMATS:
+        return px_decompress(data)
+    raise RuntimeError(f'Unknown compression format {magic!r}')
+
+def iter_decompress(src, chunk_size=STREAM_CHUNK_SIZE):
+    # Yields decompressed data a chunk at a time. `src` can be bytes, a
+    # memoryview, or a file opened in binary mode. The compressed data gets
+    # read all at once, since its size is 16 bits
+    if hasattr(src, 'read'):
+        src = src.read()
+    magic = bytes(src[0:4])
+    if magic == b'AT6P':
+        yield from at6p_iter_decompress(src, chunk_size)
+    elif magic in PX_FORMATS:
+        # Back-references need the data before them, so this isn't actually
+        # streamed, just split up
+        data = px_decompress(src)
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i+chunk_size]
+    else:
+        raise RuntimeError(f'Unknown compression format {magic!r}')
+
+def compress(data, fmt=b'AT6P', jobs=1):
+    if fmt == b'AT6P':
+        return at6p_compress_parallel(data, jobs)
+    if fmt in PX_FORMATS:
+        return px_compress(data, fmt)
+    raise RuntimeError(f'Unknown compression format {fmt!r}')
+
 def upconvert_palette(pal16):
     assert len(pal16) == 512
     pal24 = bytearray()
@@ -201,7 +605,25 @@ def read_data1(bg_dat, offset):
     # I'm not gonna bother reading the interactive stuff now
     pass
 
-def dump(bg_dat):
+def read_arrangement(bg_dat, offset, end):
+    # The data after the palette, up to the main data. I haven't confirmed what
+    # it is yet, but if it's a normal DS tilemap, every entry is 16 bits:
+    # tile number (10 bits), horizontal flip, vertical flip, palette (4 bits)
+    entries = []
+    for i in range(offset, end - 1, 2):
+        entry = int.from_bytes(bg_dat[i:i+2], 'little')
+        entries.append({
+            'tile': entry & 0x3FF,
+            'hflip': (entry >> 10) & 1,
+            'vflip': (entry >> 11) & 1,
+            'palette': entry >> 12,
+        })
+    return entries
+
+def dump(bg_dat, arrangement=False):
+    # The arrangement only gets decoded (see read_arrangement) with
+    # `arrangement`, since nothing but tile_stats uses it, and decoding it
+    # would slow down dumping every image
     if bg_dat[0:3] != b'SIR':
         raise RuntimeError('File is not a SIR0 or SIR1 file')
     if bg_dat[3:4] != b'0':
@@ -232,15 +654,83 @@ def dump(bg_dat):
         'interactive': None, # read_data1(bg_dat, ptr1) if ptr1 != 0 else None,
         'texture': bg_dat[ptr2:ptr2+((num3 - num1 + 1)*8*(num4 - num2 + 1)*8)],
         'palette': bg_dat[ptr3:ptr3+512],
-        'arrangement': None, # read_data4(bg_dat, ptr4, main_data - ptr4)
+        'arrangement': read_arrangement(bg_dat, ptr4, main_data) if arrangement else None,
     }
 
     return structured
 
+def read_palette(bg_dat, checkpoints=None):
+    # Returns just the 512-byte palette. For compressed files, only the parts
+    # of the file that are needed get decompressed, starting from the
+    # checkpoints if there are any (the main data and palette are near the end)
+    if bg_dat[0:4] in PX_FORMATS:
+        bg_dat = px_decompress(bg_dat)
+    if bg_dat[0:4] != b'AT6P':
+        main_data = int.from_bytes(bg_dat[4:8], 'little')
+        ptr3 = int.from_bytes(bg_dat[main_data+28:main_data+32], 'little')
+        return bg_dat[ptr3:ptr3+512]
+    
+    main_data = int.from_bytes(at6p_decompress_range(bg_dat, 4, 8, checkpoints), 'little')
+    ptr3 = int.from_bytes(at6p_decompress_range(bg_dat, main_data + 28, main_data + 32, checkpoints), 'little')
+    return at6p_decompress_range(bg_dat, ptr3, ptr3 + 512, checkpoints)
+
+def split_tiles(texture, width, height):
+    # The texture is stored as one plain bitmap, one byte per pixel, so this
+    # cuts it up into 8x8 tiles of 64 bytes each (left to right, top to bottom)
+    tiles = []
+    for tile_y in range(0, height, 8):
+        for tile_x in range(0, width, 8):
+            tiles.append(b''.join(texture[row*width+tile_x:row*width+tile_x+8] for row in range(tile_y, tile_y + 8)))
+    return tiles
+
+def flip_tile(tile, hflip, vflip):
+    rows = [tile[i:i+8] for i in range(0, 64, 8)]
+    if hflip:
+        rows = [row[::-1] for row in rows]
+    if vflip:
+        rows.reverse()
+    return b''.join(rows)
+
+def dedupe_tiles(tiles, flips=False):
+    # Returns (list of unique tiles, and for every tile in `tiles`, a tuple of
+    # (index in the unique list, hflip, vflip) that gets it back). With
+    # `flips`, tiles that are mirror images of each other count as the same
+    unique = []
+    seen = {}
+    arrangement = []
+    for tile in tiles:
+        found = seen.get(tile)
+        if found is None:
+            found = (len(unique), 0, 0)
+            unique.append(tile)
+            seen[tile] = found
+            if flips:
+                # Remember the flipped versions too, so they get found with
+                # one lookup later
+                for (hflip, vflip) in ((1, 0), (0, 1), (1, 1)):
+                    seen.setdefault(flip_tile(tile, hflip, vflip), (found[0], hflip, vflip))
+        arrangement.append(found)
+    return (unique, arrangement)
+
+def tile_stats(bg_dat, flips=False):
+    if is_compressed(bg_dat):
+        bg_dat = decompress(bg_dat)
+    structured = dump(bg_dat, arrangement=True)
+
+    width = (structured['right'] - structured['left'] + 1) * 8
+    height = (structured['bottom'] - structured['top'] + 1) * 8
+    tiles = split_tiles(structured['texture'], width, height)
+    (unique, _) = dedupe_tiles(tiles, flips)
+    return {
+        'tiles': len(tiles),
+        'unique_tiles': len(unique),
+        'arrangement_entries': len(structured['arrangement']),
+    }
+
 def dump_image(bg_dat):
-    # I checked, only AT6P is supported. None of the other three LZ formats.
-    if bg_dat[0:4] == b'AT6P':
-        bg_dat = at6p_decompress(bg_dat)
+    # I checked, backgrounds only use AT6P, but the other formats work too
+    if is_compressed(bg_dat):
+        bg_dat = decompress(bg_dat)
 
     structured = dump(bg_dat)
 
@@ -248,19 +738,119 @@ def dump_image(bg_dat):
     height = (structured['bottom'] - structured['top'] + 1) * 8
     pal = upconvert_palette(structured['palette'])
 
+    from PIL import Image
     image = Image.frombytes('P', (width, height), structured['texture'])
     image.putpalette(pal)
     return image
 
-def replace_image(bg_dat, image, compress=True):
+def dump_raw(bg_dat):
+    # Same as dump_image, but returns a raw indexed image (see raw_image.py),
+    # which is just the palette and pixels copied out of the file
+    if is_compressed(bg_dat):
+        bg_dat = decompress(bg_dat)
+
+    structured = dump(bg_dat)
+
+    width = (structured['right'] - structured['left'] + 1) * 8
+    height = (structured['bottom'] - structured['top'] + 1) * 8
+    return raw_image.pack(width, height, structured['palette'], structured['texture'])
+
+def median_cut(colors, max_colors):
+    # `colors` is a list of (count, r, g, b). Splits the colors into at most
+    # `max_colors` boxes, each time cutting the box with the widest range of
+    # some channel in half (by pixel count) along that channel
+    def widest(box):
+        # Returns (range, channel) of the widest channel in the box
+        return max((max(c[channel] for c in box) - min(c[channel] for c in box), channel) for channel in (1, 2, 3))
+    
+    boxes = [(colors, widest(colors))]
+    while len(boxes) < max_colors:
+        i = max(range(len(boxes)), key=lambda i: boxes[i][1][0])
+        (box, (spread, channel)) = boxes[i]
+        if spread == 0:
+            break
+        box = sorted(box, key=lambda c: c[channel])
+        half = sum(c[0] for c in box) / 2
+        total = 0
+        split = 1
+        for (j, c) in enumerate(box[:-1]):
+            total += c[0]
+            split = j + 1
+            if total >= half:
+                break
+        boxes[i:i+1] = [(box[:split], widest(box[:split])), (box[split:], widest(box[split:]))]
+    return [box for (box, _) in boxes]
+
+def quantize_bgr555(image, max_colors=256):
+    # Turns an RGB(A) image into an indexed one. The DS only has 5 bits per
+    # channel, so colors get rounded to that first, and the palette is made
+    # out of colors the DS can actually show. Transparency is ignored
+    image = image.convert('RGB')
+    # Round each channel to 5 bits (0-31) in C, instead of one pixel at a time
+    reduced = image.point([(v * 31 + 127) // 255 for v in range(256)] * 3)
+    del image
+    # Every different 15-bit color and how many pixels have it
+    colors = [(count, r, g, b) for (count, (r, g, b)) in reduced.getcolors(32768)]
+    
+    boxes = median_cut(colors, max_colors)
+    lookup = bytearray(32768)
+    palette = bytearray(768)
+    for (index, box) in enumerate(boxes):
+        total = sum(c[0] for c in box)
+        for channel in (1, 2, 3):
+            mean = (sum(c[0] * c[channel] for c in box) + total // 2) // total
+            # Same as upconvert_palette, so downconvert_palette gets the
+            # exact 5-bit value back
+            palette[index * 3 + channel - 1] = mean * 33 >> 2
+        for (_, r, g, b) in box:
+            lookup[r | (g << 5) | (b << 10)] = index
+    
+    pixels = reduced.tobytes()
+    indices = bytes(lookup[r | (g << 5) | (b << 10)] for (r, g, b) in zip(pixels[0::3], pixels[1::3], pixels[2::3]))
+    from PIL import Image
+    result = Image.frombytes('P', reduced.size, indices)
+    result.putpalette(palette)
+    return result
+
+def open_png(data):
+    # Opens a PNG file that's already in memory. Use it in a `with` statement
+    from PIL import Image
+    return Image.open(io.BytesIO(data), formats=('PNG',))
+
+def replace_image(bg_dat, image, compress=True, jobs=1, uncompressed=None):
+    # `jobs` is how many processes to compress with (None means one per CPU).
+    # `uncompressed` can be the already-decompressed data of `bg_dat`, if the
+    # caller has it, to skip decompressing it again
+    if image.mode == 'RGB' or image.mode == 'RGBA':
+        image = quantize_bgr555(image)
     if image.mode != 'P' and image.mode != 'L':
-        raise RuntimeError(f'Image must be indexed or grayscale -- instead found mode "{image.mode}"')
+        raise RuntimeError(f'Image must be indexed, grayscale, RGB or RGBA -- instead found mode "{image.mode}"')
     
-    bg_dat_compressed = None
-    bg_dat_uncompressed = bytearray(bg_dat)
-    if bg_dat[0:4] == b'AT6P':
-        bg_dat_compressed = bg_dat
-        bg_dat_uncompressed = at6p_decompress(bg_dat)
+    palette = downconvert_palette(image.getpalette())
+    return replace_pixels(bg_dat, image.width, image.height, image.tobytes(), palette, compress, jobs, uncompressed)
+
+def replace_raw(bg_dat, raw, compress=True, jobs=1, uncompressed=None):
+    # Same as replace_image, but with a raw indexed image (see raw_image.py)
+    (width, height, palette, pixels) = raw_image.unpack(raw)
+    if len(palette) < 512:
+        palette = bytes(palette) + bytes(512 - len(palette))
+    return replace_pixels(bg_dat, width, height, pixels, palette, compress, jobs, uncompressed)
+
+def replace_pixels(bg_dat, image_width, image_height, pixels, palette, compress=True, jobs=1, uncompressed=None):
+    # `pixels` is one byte per pixel, and `palette` is 512 bytes of DS colors
+    if len(palette) != 512:
+        # Anything else would move everything after the palette
+        raise RuntimeError(f'Palette should be 512 bytes (256 colors), but is {len(palette)} bytes')
+    # Only the header of the old compressed file is needed after this
+    old_header = None
+    fmt = b'AT6P'
+    if is_compressed(bg_dat):
+        old_header = bytes(bg_dat[0:0x16])
+        bg_dat_uncompressed = bytearray(uncompressed) if uncompressed is not None else decompress(bg_dat)
+        fmt = old_header[0:4]
+    else:
+        bg_dat_uncompressed = bytearray(bg_dat)
+    del bg_dat
         
     main_data_offset = int.from_bytes(bg_dat_uncompressed[4:8], 'little')
     left = int.from_bytes(bg_dat_uncompressed[main_data_offset:main_data_offset+4], 'little')
@@ -269,34 +859,45 @@ def replace_image(bg_dat, image, compress=True):
     bottom = int.from_bytes(bg_dat_uncompressed[main_data_offset+0xC:main_data_offset+0x10], 'little')
     width = (right - left + 1) * 8
     height = (bottom - top + 1) * 8
-    if image.width != width or image.height != height:
+    if image_width != width or image_height != height:
         raise RuntimeError(f'DAT file reports image size of {width}x{height} ' +
-                           f'but provided image has size {image.width}x{image.height}!')
+                           f'but provided image has size {image_width}x{image_height}!')
     pixels_offset = int.from_bytes(bg_dat_uncompressed[main_data_offset+0x18:main_data_offset+0x1C], 'little')
     palette_offset = int.from_bytes(bg_dat_uncompressed[main_data_offset+0x1C:main_data_offset+0x20], 'little')
     
-    palette = downconvert_palette(image.getpalette())
-    
-    bg_dat_uncompressed[pixels_offset:pixels_offset+width*height] = list(image.getdata())[:]
+    bg_dat_uncompressed[pixels_offset:pixels_offset+width*height] = pixels
     bg_dat_uncompressed[palette_offset:palette_offset+512] = palette
     
     if compress:
-        new_compressed = at6p_compress(bg_dat_uncompressed)
-        if bg_dat_compressed is not None:
+        # (The `compress` argument hides the function with the same name)
+        if fmt == b'AT6P':
+            new_compressed = at6p_compress_parallel(bg_dat_uncompressed, jobs)
+        else:
+            new_compressed = px_compress(bg_dat_uncompressed, fmt)
+        if old_header is not None:
             # Minimize the diff by copying over some of the weird/junk bytes from the old file
-            new_compressed[4] = bg_dat_compressed[4]
-            new_compressed[8:0x10] = bg_dat_compressed[8:0x10]
-            new_compressed[0x15] = bg_dat_compressed[0x15]
+            new_compressed[4] = old_header[4]
+            if fmt == b'AT6P':
+                new_compressed[8:0x10] = old_header[8:0x10]
+                new_compressed[0x15] = old_header[0x15]
         return new_compressed
     else:
         return bg_dat_uncompressed
 
 def print_usage(args):
     print('Usage:')
-    print(args[0], 'dump-img <bg.dat> <output.png>')
-    print(args[0], 'insert-img <original-bg.dat> <edited.png> <new-bg.dat> [--no-compress]')
+    print(args[0], 'dump-img <bg.dat> <output.png | output.idx>')
+    print(args[0], 'insert-img <original-bg.dat> <edited.png | edited.idx> <new-bg.dat> [--no-compress] [--jobs=<n>]')
+    print(args[0], 'decompress <compressed.dat> <output.dat>')
+    print(args[0], 'compress <uncompressed.dat> <output.dat> [--format=AT6P|AT5P|AT4P|AT3P] [--jobs=<n>]')
+    print(args[0], 'tile-stats <bg.dat> [--flips]')
+    print(args[0], 'index <bg.dat> <output-index.json> [--interval=<bytes>]')
 
 def main(args):
+    if len(args) < 2:
+        print_usage(args)
+        return 1
+
     display_encoding = None
     # if len(args) == 5 and args[4].startswith('--display-encoding='):
     #     # Everything after the = sign
@@ -313,47 +914,101 @@ def main(args):
         with open(args[2], 'rb') as f:
             bg_dat = f.read()
 
-        image = dump_image(bg_dat)
-        image.save(args[3], format='PNG')
+        if raw_image.is_raw_path(args[3]):
+            atomic_write.write(args[3], dump_raw(bg_dat))
+        else:
+            image = dump_image(bg_dat)
+            atomic_write.write_png(args[3], image)
     elif args[1] == 'insert-img':
-        if len(args) != 5 and len(args) != 6:
+        if len(args) < 5:
             print_usage(args)
             return 1
 
-        no_compress = len(args) == 6 and args[5] == '--no-compress'
+        no_compress = False
+        jobs = 1
+        for arg in args[5:]:
+            if arg == '--no-compress':
+                no_compress = True
+            elif arg.startswith('--jobs='):
+                jobs = int(arg[len('--jobs='):]) or None
+            else:
+                print_usage(args)
+                return 1
 
         with open(args[2], 'rb') as f:
             bg_dat = f.read()
-        with Image.open(args[3], formats=('PNG',)) as edited_image:
-            new_dat = replace_image(bg_dat, edited_image, compress = not no_compress)
-        with open(args[4], 'wb') as f:
-            f.write(new_dat)
+        with open(args[3], 'rb') as f:
+            edited = f.read()
+        if raw_image.is_raw(edited):
+            new_dat = replace_raw(bg_dat, edited, compress = not no_compress, jobs = jobs)
+        else:
+            with open_png(edited) as edited_image:
+                new_dat = replace_image(bg_dat, edited_image, compress = not no_compress, jobs = jobs)
+        atomic_write.write(args[4], new_dat)
     elif args[1] == 'decompress':
         if len(args) != 4:
-            print_usage()
+            print_usage(args)
             return 1
 
         with open(args[2], 'rb') as f:
             bg_dat = f.read()
         
-        dec = at6p_decompress(bg_dat)
+        dec = decompress(bg_dat)
         
-        with open(args[3], 'wb') as f:
-            f.write(dec)
+        atomic_write.write(args[3], dec)
     elif args[1] == 'compress':
-        if len(args) != 4:
-            print_usage()
+        if len(args) < 4:
+            print_usage(args)
             return 1
         
+        fmt = b'AT6P'
+        jobs = 1
+        for arg in args[4:]:
+            if arg.startswith('--jobs='):
+                jobs = int(arg[len('--jobs='):]) or None
+            elif arg.startswith('--format='):
+                fmt = arg[len('--format='):].upper().encode('ascii')
+                if fmt not in COMPRESSED_FORMATS:
+                    print(f'Unknown format "{arg[len("--format="):]}" -- expected AT3P, AT4P, AT5P, or AT6P')
+                    return 1
+            else:
+                print_usage(args)
+                return 1
+        
         with open(args[2], 'rb') as f:
             dec = f.read()
         
-        bg_dat = at6p_compress(dec)
+        bg_dat = compress(dec, fmt, jobs)
         
-        with open(args[3], 'wb') as f:
-            f.write(bg_dat)
+        atomic_write.write(args[3], bg_dat)
+    elif args[1] == 'tile-stats':
+        if len(args) != 3 and not (len(args) == 4 and args[3] == '--flips'):
+            print_usage(args)
+            return 1
+
+        with open(args[2], 'rb') as f:
+            bg_dat = f.read()
+
+        stats = tile_stats(bg_dat, flips = len(args) == 4)
+        repeated = stats['tiles'] - stats['unique_tiles']
+        print(f"{stats['tiles']} tiles, {stats['unique_tiles']} unique ({repeated} repeats, {repeated * 64} bytes)")
+        print(f"{stats['arrangement_entries']} arrangement entries")
+    elif args[1] == 'index':
+        interval = AT6P_CHECKPOINT_INTERVAL
+        if len(args) == 5 and args[4].startswith('--interval='):
+            interval = int(args[4][len('--interval='):], 0)
+        elif len(args) != 4:
+            print_usage(args)
+            return 1
+
+        with open(args[2], 'rb') as f:
+            bg_dat = f.read()
+
+        checkpoints = []
+        at6p_decompress(bg_dat, checkpoints, interval)
+        save_at6p_index(args[3], bg_dat, checkpoints)
     else:
-        print(f'Invalid command "{args[1]}" -- expected "dump-img," "insert-img," "decompress," or "compress"')
+        print(f'Invalid command "{args[1]}" -- expected "dump-img," "insert-img," "decompress," "compress," "tile-stats," or "index"')
         return 1
 
 if __name__ == '__main__':
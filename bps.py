@@ -0,0 +1,320 @@
+# Script to make and apply BPS patches between original and edited files (.dat or .nds)
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import itertools
+import mmap
+import os
+import sys
+import zlib
+
+import atomic_write
+
+# BPS is the usual patch format for ROM hacks these days (IPS can't handle files
+# bigger than 16 MiB, and 999 is bigger than that). A patch is a header, a list
+# of actions that build the new file from start to finish, and some checksums.
+SOURCE_READ = 0
+TARGET_READ = 1
+SOURCE_COPY = 2
+TARGET_COPY = 3
+
+# Data that moved somewhere else in the file gets found by looking up blocks of
+# this size in an index of the original file. Bigger blocks mean a smaller index
+# (about 100 bytes of memory per block) but fewer matches
+BLOCK_SIZE = 1024
+# Don't bother switching away from copying new bytes for a match shorter than this
+MIN_MATCH = 8
+# How much data to copy at once when applying a patch
+COPY_CHUNK = 1 << 20
+
+def encode_number(n):
+    out = bytearray()
+    while True:
+        x = n & 0x7F
+        n >>= 7
+        if n == 0:
+            out.append(0x80 | x)
+            return out
+        out.append(x)
+        n -= 1
+
+def decode_number(data, i):
+    # Returns (number, index after the number)
+    n = 0
+    shift = 1
+    while True:
+        x = data[i]
+        i += 1
+        n += (x & 0x7F) * shift
+        if x & 0x80:
+            return (n, i)
+        shift <<= 7
+        n += shift
+
+def encode_signed(n):
+    return encode_number((abs(n) << 1) | (n < 0))
+
+def map_file(f):
+    # mmap can't map empty files, but an empty bytes object works the same here
+    if os.fstat(f.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def match_length(a, a_pos, b, b_pos, limit):
+    # Returns how many bytes match, starting at a[a_pos] and b[b_pos], up to
+    # `limit`. Compares big chunks first, and smaller ones once they stop matching
+    n = 0
+    step = 4096
+    while n < limit:
+        step = min(step, limit - n)
+        if a[a_pos+n:a_pos+n+step] == b[b_pos+n:b_pos+n+step]:
+            n += step
+        elif step == 1:
+            break
+        else:
+            step = max(step // 16, 1)
+    return n
+
+def run_length(data, pos, limit):
+    # How many times the byte at data[pos] repeats, starting at pos
+    n = 1
+    run = data[pos:pos+1] * 256
+    while n < limit:
+        step = min(256, limit - n)
+        if data[pos+n:pos+n+step] == run[:step]:
+            n += step
+        else:
+            while n < limit and data[pos+n] == run[0]:
+                n += 1
+            break
+    return n
+
+class PatchWriter:
+    def __init__(self, f):
+        self.f = f
+        self.crc = 0
+
+    def write(self, data):
+        self.f.write(data)
+        self.crc = zlib.crc32(data, self.crc)
+
+    def action(self, kind, length):
+        self.write(encode_number(((length - 1) << 2) | kind))
+
+def weak_checksum(block):
+    # rsync's rolling checksum: `a` is the sum of the bytes, and `b` is the sum
+    # of the running totals of `a`. Both can be updated for the next block
+    # over without looking at the rest of it (see roll_checksum)
+    a = sum(block) & 0xFFFF
+    b = sum(itertools.accumulate(block)) & 0xFFFF
+    return (a, b)
+
+def roll_checksum(a, b, out_byte, in_byte):
+    # Moves the block one byte forward: `out_byte` leaves at the start, and
+    # `in_byte` comes in at the end
+    a = (a - out_byte + in_byte) & 0xFFFF
+    b = (b - BLOCK_SIZE * out_byte + a) & 0xFFFF
+    return (a, b)
+
+def build_block_index(source):
+    # Only the first copy of each block is kept, so a file full of repeats
+    # doesn't make the index any bigger. Different blocks can have the same
+    # checksum, so matches still have to be checked against the real data
+    index = {}
+    for offset in range(0, len(source) - BLOCK_SIZE + 1, BLOCK_SIZE):
+        (a, b) = weak_checksum(source[offset:offset+BLOCK_SIZE])
+        index.setdefault(a | (b << 16), offset)
+    return index
+
+def make_patch(source, target, f):
+    # `source` and `target` can be anything that can be sliced, like bytes or
+    # an mmap. The patch gets written to the file object `f`
+    out = PatchWriter(f)
+    out.write(b'BPS1')
+    out.write(encode_number(len(source)))
+    out.write(encode_number(len(target)))
+    out.write(encode_number(0))
+
+    index = None
+    # Checksum of target[checksum_pos:checksum_pos+BLOCK_SIZE], kept up to
+    # date one byte at a time while nothing matches
+    checksum_pos = None
+    (a, b) = (0, 0)
+    source_relative = 0
+    target_relative = 0
+    literal_start = 0
+    pos = 0
+    target_len = len(target)
+
+    def flush_literal(end):
+        if end > literal_start:
+            out.action(TARGET_READ, end - literal_start)
+            out.write(target[literal_start:end])
+
+    while pos < target_len:
+        # Most of the time, data is still where it was in the original file
+        if pos < len(source):
+            n = match_length(source, pos, target, pos, min(len(source), target_len) - pos)
+            if n >= MIN_MATCH or (n > 0 and pos + n == target_len):
+                flush_literal(pos)
+                out.action(SOURCE_READ, n)
+                pos += n
+                literal_start = pos
+                continue
+
+        # Runs of the same byte (like padding) can copy from the new file itself
+        if pos > 0 and target[pos] == target[pos - 1]:
+            n = run_length(target, pos, target_len - pos)
+            if n >= MIN_MATCH:
+                flush_literal(pos)
+                out.action(TARGET_COPY, n)
+                out.write(encode_signed(pos - 1 - target_relative))
+                target_relative = pos - 1 + n
+                pos += n
+                literal_start = pos
+                continue
+
+        # Otherwise, maybe the data moved somewhere else
+        if pos + BLOCK_SIZE <= target_len and len(source) >= BLOCK_SIZE:
+            if index is None:
+                index = build_block_index(source)
+            if checksum_pos == pos - 1:
+                (a, b) = roll_checksum(a, b, target[pos - 1], target[pos + BLOCK_SIZE - 1])
+            else:
+                (a, b) = weak_checksum(target[pos:pos+BLOCK_SIZE])
+            checksum_pos = pos
+            candidate = index.get(a | (b << 16))
+            # match_length compares the actual bytes, so a block that only has
+            # the same checksum doesn't count
+            if candidate is not None:
+                n = match_length(source, candidate, target, pos, min(len(source) - candidate, target_len - pos))
+                if n >= BLOCK_SIZE:
+                    flush_literal(pos)
+                    out.action(SOURCE_COPY, n)
+                    out.write(encode_signed(candidate - source_relative))
+                    source_relative = candidate + n
+                    pos += n
+                    literal_start = pos
+                    continue
+
+        pos += 1
+    flush_literal(pos)
+
+    out.write(zlib.crc32(source).to_bytes(4, 'little'))
+    out.write(zlib.crc32(target).to_bytes(4, 'little'))
+    f.write(out.crc.to_bytes(4, 'little'))
+
+def apply_patch(source, patch, f):
+    # Writes the patched file to `f`, which has to be opened for both reading
+    # and writing (w+b), since TargetCopy actions read back what was written
+    if patch[0:4] != b'BPS1':
+        raise RuntimeError('Not a BPS patch')
+    if zlib.crc32(patch[:-4]) != int.from_bytes(patch[-4:], 'little'):
+        raise RuntimeError('The patch file is corrupted (checksum mismatch)')
+    if zlib.crc32(source) != int.from_bytes(patch[-12:-8], 'little'):
+        raise RuntimeError('This patch is for a different original file (checksum mismatch)')
+
+    (source_size, i) = decode_number(patch, 4)
+    (target_size, i) = decode_number(patch, i)
+    (metadata_size, i) = decode_number(patch, i)
+    i += metadata_size
+    if source_size != len(source):
+        raise RuntimeError(f'This patch is for a file of size {source_size}, but the original file has size {len(source)}')
+
+    end = len(patch) - 12
+    output_pos = 0
+    source_relative = 0
+    target_relative = 0
+    target_crc = 0
+
+    def write(data):
+        nonlocal output_pos, target_crc
+        f.write(data)
+        target_crc = zlib.crc32(data, target_crc)
+        output_pos += len(data)
+
+    while i < end:
+        (data, i) = decode_number(patch, i)
+        kind = data & 3
+        length = (data >> 2) + 1
+
+        if kind == SOURCE_READ:
+            read_end = output_pos + length
+            for start in range(output_pos, read_end, COPY_CHUNK):
+                write(source[start:min(start + COPY_CHUNK, read_end)])
+        elif kind == TARGET_READ:
+            write(patch[i:i+length])
+            i += length
+        else:
+            (offset, i) = decode_number(patch, i)
+            offset = -(offset >> 1) if offset & 1 else offset >> 1
+            if kind == SOURCE_COPY:
+                source_relative += offset
+                remaining = length
+                while remaining > 0:
+                    n = min(remaining, COPY_CHUNK)
+                    write(source[source_relative:source_relative+n])
+                    source_relative += n
+                    remaining -= n
+            else:
+                target_relative += offset
+                if not 0 <= target_relative < output_pos:
+                    raise RuntimeError(f'The patch file is corrupted (copies from 0x{target_relative:X} of the new file, which only has 0x{output_pos:X} bytes so far)')
+                remaining = length
+                while remaining > 0:
+                    # The copy can overlap the data it's creating (runs of the
+                    # same byte always do). Then only the last `period` bytes
+                    # exist yet, and the rest of the copy is them repeated
+                    period = output_pos - target_relative
+                    n = min(remaining, COPY_CHUNK)
+                    f.seek(target_relative)
+                    chunk = f.read(min(period, n))
+                    f.seek(0, os.SEEK_END)
+                    if len(chunk) < n:
+                        chunk = (chunk * (n // len(chunk) + 1))[:n]
+                    write(chunk)
+                    target_relative += n
+                    remaining -= n
+
+    if output_pos != target_size:
+        raise RuntimeError(f'Patched file has size {output_pos}, but the patch says it should be {target_size}')
+    if target_crc != int.from_bytes(patch[-8:-4], 'little'):
+        raise RuntimeError('Patched file is corrupted (checksum mismatch)')
+
+def print_usage(args):
+    print('Usage:')
+    print(f'    python {args[0]} make <original-file> <edited-file> <output.bps>')
+    print(f'    python {args[0]} apply <original-file> <patch.bps> <output-file>')
+
+def main(args):
+    if len(args) >= 2 and args[1] == 'make':
+        if len(args) != 5:
+            print_usage(args)
+            return 1
+
+        with open(args[2], 'rb') as source_file, open(args[3], 'rb') as target_file:
+            source = map_file(source_file)
+            target = map_file(target_file)
+            with atomic_write.open_output(args[4]) as f:
+                make_patch(source, target, f)
+    elif len(args) >= 2 and args[1] == 'apply':
+        if len(args) != 5:
+            print_usage(args)
+            return 1
+
+        with open(args[2], 'rb') as source_file, open(args[3], 'rb') as patch_file:
+            source = map_file(source_file)
+            patch = map_file(patch_file)
+            with atomic_write.open_output(args[4], 'w+b') as f:
+                apply_patch(source, patch, f)
+    else:
+        if len(args) == 1:
+            print_usage(args)
+            return 1
+        print(f'Invalid command "{args[1]}" -- expected "make" or "apply"')
+        return 1
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
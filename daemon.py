@@ -0,0 +1,336 @@
+# Script that keeps all of the tools loaded and answers requests from editors/other programs
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import collections
+import contextlib
+import importlib
+from io import StringIO
+import json
+import os
+import socketserver
+import sys
+import time
+import traceback
+
+import atomic_write
+
+# Starting Python and importing Pillow takes longer than most conversions, so
+# an editor plugin that runs `py room_data.py make ...` after every save spends
+# most of its time waiting for that. This script starts once and then takes
+# requests in JSON-RPC 2.0 (one JSON object per line), either on stdin/stdout
+# or on a Unix socket. Nothing ever listens on the network.
+
+# Tools that the "run" method can run, like they were run from the command line
+TOOLS = ('bg_files', 'bps', 'camera_rooms', 'chara', 'file', 'font', 'nitrofs', 'room_data', 'sir0', 'staff_roll', 'validate', 'xref')
+
+# How many things of each kind to keep in memory
+CACHE_SIZE = 64
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+TOOL_ERROR = -32000
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+class LRUCache:
+    # Keeps the `max_entries` most recently used values
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        # Returns the cached value for `key`, or calls load() to make it
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        value = load()
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+def file_key(path):
+    # Cached things are only good until the file changes
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def tool(name):
+    # Imports a tool the first time it's needed. It stays imported after that
+    if name not in TOOLS:
+        raise RpcError(INVALID_PARAMS, f'Unknown tool "{name}" -- expected one of: {", ".join(TOOLS)}')
+    return importlib.import_module(name)
+
+# Table tool -> (function that dumps it, function that makes it). Both take
+# the display encoding, even the tools that always use Shift-JIS
+TABLE_TOOLS = {
+    'chara': (lambda data, enc: tool('chara').dump(data), lambda obj, enc: tool('chara').make_sir0_from_list(obj)),
+    'file': (lambda data, enc: tool('file').dump(data), lambda obj, enc: tool('file').make_sir0_from_list(obj)),
+    'room_data': (lambda data, enc: tool('room_data').dump(data, enc), lambda obj, enc: tool('room_data').make_sir0_from_obj_list(obj, enc)),
+    'camera_rooms': (lambda data, enc: tool('camera_rooms').dump(data, enc), lambda obj, enc: tool('camera_rooms').make_sir0_from_obj_list(obj, enc)),
+    'staff_roll': (lambda data, enc: tool('staff_roll').dump(data, enc or 'mskanji'), lambda obj, enc: tool('staff_roll').make_sir0_from_dict(obj, enc or 'mskanji')),
+}
+
+def param(params, name, default=None, required=True):
+    if name in params:
+        return params[name]
+    if required and default is None:
+        raise RpcError(INVALID_PARAMS, f'Missing parameter "{name}"')
+    return default
+
+def display_encoding(params):
+    return 'latin_1' if params.get('ptbr') else None
+
+def table_tool(params):
+    name = param(params, 'tool')
+    if name.endswith('.py'):
+        name = name[:-3]
+    if name not in TABLE_TOOLS:
+        raise RpcError(INVALID_PARAMS, f'"{name}" is not a table tool -- expected one of: {", ".join(TABLE_TOOLS)}')
+    return name
+
+def json_param(params):
+    # Editors can send the JSON they have open directly as "data", so it
+    # doesn't have to be saved first, or give a "path" to a JSON file
+    if 'data' in params:
+        return params['data']
+    with open(param(params, 'path'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class Daemon:
+    def __init__(self):
+        self.dumps = LRUCache(CACHE_SIZE)
+        self.decompressed = LRUCache(CACHE_SIZE)
+        self.font_codes = LRUCache(CACHE_SIZE)
+        self.stopped = False
+        self.methods = {
+            'ping': self.ping,
+            'run': self.run,
+            'dump': self.dump,
+            'make': self.make,
+            'dump_img': self.dump_img,
+            'insert_img': self.insert_img,
+            'validate': self.validate,
+            'stats': self.stats,
+            'shutdown': self.shutdown,
+        }
+
+    def ping(self, params):
+        return 'pong'
+
+    def run(self, params):
+        # Runs a tool exactly like the command line would, and returns what it printed
+        module = tool(param(params, 'tool'))
+        args = [module.__name__ + '.py', *param(params, 'args')]
+        output = StringIO()
+        # Some tools quit with the exit() builtin, which closes sys.stdin on
+        # the way out. That's where the requests come from, so hide it first
+        stdin = sys.stdin
+        sys.stdin = StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                exit_code = module.main(args)
+        except SystemExit as e:
+            exit_code = e.code
+        finally:
+            sys.stdin = stdin
+        return {'exit_code': exit_code or 0, 'output': output.getvalue()}
+
+    def dump(self, params):
+        name = table_tool(params)
+        path = param(params, 'path')
+        enc = display_encoding(params)
+        (dump, _) = TABLE_TOOLS[name]
+        # Nothing changes the cached structure, since it only gets turned into JSON
+        return self.dumps.get((name, enc) + file_key(path), lambda: dump(read_file(path), enc))
+
+    def make(self, params):
+        name = table_tool(params)
+        output = param(params, 'output')
+        (_, make) = TABLE_TOOLS[name]
+        data = make(json_param(params), display_encoding(params))
+        written = atomic_write.write(output, data)
+        return {'output': output, 'size': len(data), 'written': written}
+
+    def decompressed_bg(self, path):
+        bg_files = tool('bg_files')
+        def load():
+            data = read_file(path)
+            return bytes(bg_files.decompress(data)) if bg_files.is_compressed(data) else data
+        return self.decompressed.get(file_key(path), load)
+
+    def dump_img(self, params):
+        bg_files = tool('bg_files')
+        raw_image = importlib.import_module('raw_image')
+        uncompressed = self.decompressed_bg(param(params, 'bg'))
+        output = param(params, 'output')
+        if raw_image.is_raw_path(output):
+            written = atomic_write.write(output, bg_files.dump_raw(uncompressed))
+        else:
+            written = atomic_write.write_png(output, bg_files.dump_image(uncompressed))
+        return {'output': output, 'written': written}
+
+    def insert_img(self, params):
+        bg_files = tool('bg_files')
+        raw_image = importlib.import_module('raw_image')
+        bg_path = param(params, 'bg')
+        output = param(params, 'output')
+        compress = param(params, 'compress', True)
+
+        bg_dat = read_file(bg_path)
+        uncompressed = self.decompressed_bg(bg_path) if bg_files.is_compressed(bg_dat) else None
+        edited = read_file(param(params, 'image'))
+        if raw_image.is_raw(edited):
+            data = bg_files.replace_raw(bg_dat, edited, compress, uncompressed=uncompressed)
+        else:
+            with bg_files.open_png(edited) as image:
+                data = bg_files.replace_image(bg_dat, image, compress, uncompressed=uncompressed)
+        written = atomic_write.write(output, data)
+        return {'output': output, 'size': len(data), 'written': written}
+
+    def validate(self, params):
+        validate = tool('validate')
+        name = param(params, 'tool')
+        if name.endswith('.py'):
+            name = name[:-3]
+        if name not in validate.TOOLS:
+            raise RpcError(INVALID_PARAMS, f'Unknown tool "{name}" -- expected one of: {", ".join(validate.TOOLS)}')
+
+        font_codes = None
+        font_path = params.get('font')
+        if font_path is not None:
+            font_codes = self.font_codes.get(file_key(font_path), lambda: validate.load_font_codes(read_file(font_path)))
+
+        validator = validate.Validator(display_encoding(params), font_codes)
+        validator.check(params.get('path', '<data>'), name, json_param(params))
+        return {'checked': validator.checked, 'problems': validator.problems}
+
+    def stats(self, params):
+        return {
+            'dumps': self.dumps.stats(),
+            'decompressed': self.decompressed.stats(),
+            'font_codes': self.font_codes.stats(),
+            'files': dict(zip(('written', 'unchanged'), atomic_write.stats())),
+        }
+
+    def shutdown(self, params):
+        self.stopped = True
+        return None
+
+    def handle_line(self, line):
+        # Returns the response line, or None for notifications (no "id")
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise RpcError(PARSE_ERROR, f'Parse error: {e}')
+            if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                raise RpcError(INVALID_REQUEST, 'Invalid request')
+            request_id = request.get('id')
+            method = self.methods.get(request['method'])
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f'Unknown method "{request["method"]}"')
+            params = request.get('params', {})
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, 'params must be an object')
+
+            start = time.perf_counter()
+            # Anything the tools print would get mixed up with the responses
+            # on stdout, so it goes to stderr instead
+            with contextlib.redirect_stdout(sys.stderr):
+                result = method(params)
+            print(f'{request["method"]}: {(time.perf_counter() - start) * 1000:.1f} ms', file=sys.stderr)
+            response = {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+        except RpcError as e:
+            response = {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': e.code, 'message': str(e)}}
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            response = {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': TOOL_ERROR, 'message': f'{type(e).__name__}: {e}'}}
+
+        if request_id is None and 'error' not in response:
+            return None
+        return json.dumps(response, ensure_ascii=False)
+
+def serve_stdio(daemon):
+    for line in sys.stdin:
+        if line.strip() == '':
+            continue
+        response = daemon.handle_line(line)
+        if response is not None:
+            sys.stdout.write(response + '\n')
+            sys.stdout.flush()
+        if daemon.stopped:
+            break
+
+def serve_socket(daemon, socket_path):
+    if not hasattr(socketserver, 'UnixStreamServer'):
+        raise RuntimeError('Unix sockets are not supported on this system -- use stdin/stdout instead')
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if line.strip() == b'':
+                    continue
+                response = daemon.handle_line(line)
+                if response is not None:
+                    self.wfile.write(response.encode('utf-8') + b'\n')
+                    self.wfile.flush()
+                if daemon.stopped:
+                    break
+
+    # Left over from a daemon that didn't shut down cleanly
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.UnixStreamServer(socket_path, Handler) as server:
+        print(f'Listening on {socket_path}', file=sys.stderr)
+        try:
+            while not daemon.stopped:
+                server.handle_request()
+        finally:
+            os.remove(socket_path)
+
+def print_usage(args):
+    print('Usage:')
+    print(f'    python {args[0]} [--socket=<path>]')
+
+def main(args):
+    socket_path = None
+    for arg in args[1:]:
+        if arg.startswith('--socket='):
+            socket_path = arg[len('--socket='):]
+        else:
+            print_usage(args)
+            return 1
+
+    daemon = Daemon()
+    try:
+        if socket_path is None:
+            serve_stdio(daemon)
+        else:
+            serve_socket(daemon, socket_path)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
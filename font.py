@@ -1,14 +1,20 @@
 # Script to convert back and forth between etc/kanji*.dat and PNG+JSON files
 # for 999: Nine Hours, Nine Persons, Nine Doors (DS)
 # by PhoenixBound
-# Last updated: 2025-04-06
+# Last updated: 2026-10-19
 
-from io import StringIO
+from io import BytesIO, StringIO
 import itertools
 import json
+import operator
+import re
 import sys
+import unicodedata
 
-from PIL import Image
+import atomic_write
+import raw_image
+import sir0
+import validate
 
 # https://stackoverflow.com/a/8991553
 # https://docs.python.org/3/library/itertools.html#itertools.batched
@@ -44,6 +50,91 @@ def to_encoded_display_str(s, encoding):
         encoding = 'mskanji'
     return s.encode(encoding) + b'\0'
 
+# Pixels in a row of the PNG go from left to right, but in the font, the
+# leftmost pixel is the lowest bit. This flips a 14-pixel row between the two
+REVERSED_ROWS = [int(f'{i:014b}'[::-1], 2) for i in range(1 << 14)]
+
+# Each square in the PNG, as font graphics: 14 rows of 2 bytes
+CELL_SIZE = 14 * 2
+
+# For raw images (see raw_image.py): palette index 1 is a pixel of the
+# character, and anything else is background
+RAW_PALETTE = b'\x00\x00\xFF\x7F'
+RAW_PIXELS_FROM_L = bytes(1 if v >= 128 else 0 for v in range(256))
+L_FROM_RAW_PIXELS = bytes(255 if v == 1 else 0 for v in range(256))
+
+class Glyph:
+    # One character of the font. Fonts can have thousands of these, so they use
+    # __slots__ instead of being dicts, and only get turned into dicts when
+    # reading or writing the JSON
+    __slots__ = ('code', 'code_bytes', 'left_offset', 'top_offset', 'unk4',
+                 'canvas_height', 'width', 'unk7', 'gfx', 'sort_key')
+
+    def __init__(self, code, code_bytes, left_offset, top_offset, unk4, canvas_height, width, unk7, gfx):
+        # `code` is the character as a string, or None if `code_bytes` isn't
+        # valid Shift-JIS
+        self.code = code
+        self.code_bytes = code_bytes
+        self.left_offset = left_offset
+        self.top_offset = top_offset
+        self.unk4 = unk4
+        self.canvas_height = canvas_height
+        self.width = width
+        self.unk7 = unk7
+        self.gfx = gfx
+        # Characters get sorted by SJIS byte sequence (the game does a binary
+        # search), with one-byte codes first
+        self.sort_key = b'\x00' + code_bytes if len(code_bytes) == 1 else code_bytes
+
+    def describe(self):
+        if self.code is None:
+            return f'code_bytes = {self.code_bytes}'
+        return f"code = '{self.code}'"
+
+    def to_json(self, gfx_pos):
+        result = {
+            'left_offset': self.left_offset,
+            'top_offset': self.top_offset,
+            'unk4': self.unk4,
+            'canvas_height': self.canvas_height,
+            'width': self.width,
+            'unk7': self.unk7,
+        }
+        if self.code is not None:
+            result['code'] = self.code
+        else:
+            result['code_bytes'] = self.code_bytes.hex()
+        result['gfx_pos'] = gfx_pos
+        return result
+
+    @staticmethod
+    def from_json(char, i, atlas):
+        # `i` is the character's index in the JSON list, for error messages.
+        # `atlas` is the graphics from read_chars_from_image
+        code = char.get('code')
+        if code is not None:
+            code_bytes = code.encode('mskanji')
+            if 'code_bytes' in char:
+                if bytes.fromhex(char['code_bytes']) == code_bytes:
+                    print(f"WARNING: redundant 'code_bytes' field in metadata for character {i} in list, with character code '{code}'")
+                else:
+                    raise ValueError(f"Character {i} has 'code' and 'code_bytes' fields both set, to different values" + \
+                                     f"(code = {code} / {code_bytes}, code_bytes = {char['code_bytes']})." + \
+                                     "Please remove one of the fields.")
+        else:
+            if 'code_bytes' not in char:
+                raise ValueError(f'No "code" or "code_bytes" field in character (index {i} in chars list)')
+            code_bytes = bytes.fromhex(char['code_bytes'])
+
+        gfx_pos = char['gfx_pos']
+        if not 0 <= gfx_pos < len(atlas) // CELL_SIZE:
+            raise ValueError(f'Character {i} has gfx_pos {gfx_pos}, but the image only has {len(atlas) // CELL_SIZE} squares')
+        canvas_height = char['canvas_height']
+        gfx = atlas[gfx_pos*CELL_SIZE:gfx_pos*CELL_SIZE+canvas_height*2]
+
+        return Glyph(code, code_bytes, char['left_offset'], char['top_offset'], char['unk4'],
+                     canvas_height, char['width'], char['unk7'], gfx)
+
 def read_char(kanji_dat, offset):
     code = bytearray(kanji_dat[offset:offset+2])
     if code[1] != 0:
@@ -51,35 +142,21 @@ def read_char(kanji_dat, offset):
     else:
         code.pop()
 
-    code_bytes = None
+    code_bytes = bytes(code)
     try:
-        code = code.decode('mskanji')
+        code = code_bytes.decode('mskanji')
     except UnicodeError:
-        code_bytes = bytes(code)
         code = None
 
-    unk2 = as_signed_byte(kanji_dat[offset + 2])
-    unk3 = as_signed_byte(kanji_dat[offset + 3])
-    unk4 = as_signed_byte(kanji_dat[offset + 4])
-    unk5 = kanji_dat[offset + 5]
-    width = kanji_dat[offset + 6]
-    unk7 = kanji_dat[offset + 7]
-    gfx = kanji_dat[offset+8:offset+8+unk5*2]
-
-    result = {\
-        'left_offset': unk2,   \
-        'top_offset': unk3,    \
-        'unk4': unk4,          \
-        'canvas_height': unk5, \
-        'width': width,        \
-        'unk7': unk7,          \
-        'gfx': gfx             \
-    }
-    if code is not None:
-        result['code'] = code
-    else:
-        result['code_bytes'] = code_bytes
-    return result
+    canvas_height = kanji_dat[offset + 5]
+    return Glyph(code, code_bytes,
+                 as_signed_byte(kanji_dat[offset + 2]),
+                 as_signed_byte(kanji_dat[offset + 3]),
+                 as_signed_byte(kanji_dat[offset + 4]),
+                 canvas_height,
+                 kanji_dat[offset + 6],
+                 kanji_dat[offset + 7],
+                 bytes(kanji_dat[offset+8:offset+8+canvas_height*2]))
 
 def cheaply_visualize_char(raw_gfx):
     rows = []
@@ -123,73 +200,101 @@ def dump(kanji_dat):
 
 def build_image(data, width):
     height = (len(data['chars']) + width - 1) // width
-    img = Image.new('1', (width*14, height*14))
-
-    img_row = 0
-    img_col = 0
-    for char in data['chars']:
-        canvas_height = char['canvas_height']
-        one_char = Image.new('1', (14, canvas_height))
-        for (row, row_data) in zip(range(canvas_height), batched(char['gfx'], 2, strict=True)):
-            row_data_combined = row_data[0] | (row_data[1] << 8)
-            for col in range(14):
-                one_char.putpixel((col, row), row_data_combined & 1)
-                row_data_combined >>= 1
-        img.paste(one_char, (img_col * 14, \
-                             img_row * 14, \
-                             img_col * 14 + 14, \
-                             img_row * 14 + canvas_height))
-        img_col += 1
-        if img_col == width:
-            img_col = 0
-            img_row += 1
-
-    return img
+    # Build each row of pixels as one big number (leftmost pixel in the highest
+    # bit), then turn them all into a 1-bit image at once
+    rows = [0] * (height * 14)
+
+    for (i, char) in enumerate(data['chars']):
+        (img_row, img_col) = divmod(i, width)
+        shift = (width - 1 - img_col) * 14
+        gfx = char.gfx
+        for row in range(char.canvas_height):
+            row_data = (gfx[row*2] | (gfx[row*2+1] << 8)) & 0x3FFF
+            rows[img_row * 14 + row] |= REVERSED_ROWS[row_data] << shift
+
+    stride = (width * 14 + 7) // 8
+    padding = stride * 8 - width * 14
+    pixels = b''.join((row << padding).to_bytes(stride, 'big') for row in rows)
+    # Pillow is slow to import, and only needed here and in parse_edited_font
+    from PIL import Image
+    return Image.frombytes('1', (width*14, height*14), pixels)
 
 def read_chars_from_image(img):
+    # Returns the graphics of every 14x14 square in the image (left to right,
+    # top to bottom), CELL_SIZE bytes each, all in one bytes object
     width = img.width
     height = img.height
     if width % 14 != 0 or height % 14 != 0:
         raise ValueError(f'Bad image dimensions {width}x{height} -- dimensions must be multiples of 14')
     # Silently convert to a pure black and white image, based on a threshold of (rec_601_luma < 128)
     img = img.convert('1', dither=None)
-    chars = []
-
-    for row in range(0, height, 14):
-        for col in range(0, width, 14):
-            char_image = img.crop((col, row, col + 14, row + 14))
-            char = bytearray()
-            for char_row in range(14):
-                row_data = 0
-                for char_col in range(14):
-                    row_data >>= 1
-                    pixel = char_image.getpixel((char_col, char_row))
-                    assert pixel == 0 or pixel == 255
-                    pixel >>= 7
-                    row_data |= pixel << 13
-                char.extend(row_data.to_bytes(2, 'little'))
-            chars.append(char)
-
-    return chars
+    pixels = img.tobytes()
+    stride = (width + 7) // 8
+    padding = stride * 8 - width
+    cols = width // 14
+    atlas = bytearray(cols * (height // 14) * CELL_SIZE)
+
+    for y in range(height):
+        row = int.from_bytes(pixels[y*stride:(y+1)*stride], 'big') >> padding
+        offset = (y // 14) * cols * CELL_SIZE + (y % 14) * 2
+        for col in range(cols - 1, -1, -1):
+            row_data = REVERSED_ROWS[row & 0x3FFF]
+            atlas[offset + col*CELL_SIZE] = row_data & 0xFF
+            atlas[offset + col*CELL_SIZE + 1] = row_data >> 8
+            row >>= 14
+
+    return bytes(atlas)
+
+def trim_glyphs(chars, width_gap=None):
+    # Cuts blank rows off the top and bottom of every character, moving
+    # top_offset down to match, so the game draws exactly the same pixels with
+    # less data to copy. If `width_gap` is given, each character's width also
+    # gets set to `width_gap` pixels past its rightmost pixel. Returns how many
+    # bytes of graphics got removed
+    saved = 0
+    for char in chars:
+        gfx = char.gfx
+        rows = [int.from_bytes(gfx[i:i+2], 'little') for i in range(0, len(gfx), 2)]
+        used = [i for (i, row) in enumerate(rows) if row != 0]
+        if len(used) == 0:
+            # Keep one blank row for blank characters (like spaces), since I
+            # don't know how the game handles a character with no rows at all
+            if len(rows) > 1:
+                saved += len(gfx) - 2
+                char.gfx = gfx[0:2]
+                char.canvas_height = 1
+            continue
+
+        (first, last) = (used[0], used[-1])
+        if first != 0 or last != len(rows) - 1:
+            if not -128 <= char.top_offset + first <= 127:
+                raise ValueError(f"Can't trim character ({char.describe()}): top_offset would be out of range")
+            saved += len(gfx) - (last - first + 1) * 2
+            char.gfx = gfx[first*2:(last+1)*2]
+            char.canvas_height = last - first + 1
+            char.top_offset += first
+
+        if width_gap is not None:
+            combined = 0
+            for row in rows:
+                combined |= row
+            char.width = combined.bit_length() + width_gap
+    return saved
 
 def make_sir0_from_dict(structured):
-    character_data = bytearray()
-    main_data = bytearray()
-    main_pointer_locs = []
-
-    sir_header_size = 0x10
+    builder = sir0.Sir0Builder(['.chr', '.main'])
+    character_data = builder.sections['.chr']
+    main_data = builder.sections['.main']
 
-    # TODO: rewrite for kanji.dat
-    main_data.extend(len(structured['chars']).to_bytes(4, 'little'))
-    main_data.extend(structured['unk4'].to_bytes(4, 'little'))
-    main_data.extend(structured['unk8'].to_bytes(4, 'little'))
-    main_pointer_locs.append((len(main_data), '.chr'))
-    main_data.extend((0).to_bytes(4, 'little'))
+    builder.add_u32('.main', len(structured['chars']))
+    builder.add_u32('.main', structured['unk4'])
+    builder.add_u32('.main', structured['unk8'])
+    builder.add_pointer('.main', '.chr', 0)
 
     for char in structured['chars']:
         main_data.extend((len(character_data) // 2).to_bytes(2, 'little'))
 
-        code = bytearray(char['code_bytes'])
+        code = bytearray(char.code_bytes)
         if len(code) == 1:
             code.append(0)
         else:
@@ -198,72 +303,114 @@ def make_sir0_from_dict(structured):
         character_data.extend(code)
         del code
 
-        character_data.append(char['left_offset'] & 0xFF)
-        character_data.append(char['top_offset'] & 0xFF)
-        character_data.append(char['unk4'] & 0xFF)
-        character_data.append(char['canvas_height'])
-        character_data.append(char['width'])
-        character_data.append(char['unk7'])
-        character_data.extend(char['gfx'])
-    # Align character_data to a multiple of 4 bytes if necessary
-    while len(character_data) % 4 != 0:
-        character_data.append(0xAA)
-
-    # Fix the literal addresses of all pointers so that they match their pointees' file addresses
-    for (p, t) in main_pointer_locs:
-        old_pointer = int.from_bytes(main_data[p:p+4], 'little')
-
-        assert t == '.chr'
-        new_pointer = old_pointer + sir_header_size
-
-        main_data[p:p+4] = new_pointer.to_bytes(4, 'little')
-
-    # Compile a list of all the pointers' locations in the file
-    pointer_locs = [4, 8]
-    pointer_locs.extend([x[0] + sir_header_size + len(character_data) for x in main_pointer_locs])
-
-    # Go through every entry (except the first one) in pointer_locs starting from the end
-    i = len(pointer_locs) - 1 
-    while i > 0:
-        # Turn it into the distance from the previous pointer location
-        pointer_locs[i] -= pointer_locs[i - 1]
-        i -= 1
-    del i
-
-    out_file_data = bytearray()
-    out_file_data.extend(b'SIR0')
-    out_file_data.extend((sir_header_size + len(character_data)).to_bytes(4, 'little'))
-    out_file_data.extend(((sir_header_size + len(character_data) + len(main_data) + 0xF) & ~0xF).to_bytes(4, 'little'))
-    out_file_data.extend(b'\x00\x00\x00\x00')
-    out_file_data.extend(character_data)
-    out_file_data.extend(main_data)
-    while len(out_file_data) % 16 != 0:
-        out_file_data.append(0xAA)
-
-    # Now, finally, add the pointer metadata
-    d = bytearray()
-    for loc in pointer_locs:
-        d.clear()
-        while loc != (loc & 0x7F):
-            d.append(loc & 0x7F)
-            loc >>= 7
-        d.append(loc)
-        d.reverse()
-        for i in range(len(d) - 1):
-            d[i] |= 0x80
-        out_file_data.extend(d)
-    del d
-    out_file_data.append(0)
-
-    while len(out_file_data) % 16 != 0:
-        out_file_data.append(0xAA)
-
-    return out_file_data
+        character_data.append(char.left_offset & 0xFF)
+        character_data.append(char.top_offset & 0xFF)
+        character_data.append(char.unk4 & 0xFF)
+        character_data.append(char.canvas_height)
+        character_data.append(char.width)
+        character_data.append(char.unk7)
+        character_data.extend(char.gfx)
+
+    return builder.build()
+
+def dump_to_files(kanji_dat, png_path, json_path):
+    structured = dump(kanji_dat)
+
+    img = build_image(structured, 32)
+    if raw_image.is_raw_path(png_path):
+        # Black background (0) and white characters (1)
+        pixels = img.convert('L').tobytes().translate(RAW_PIXELS_FROM_L)
+        atomic_write.write(png_path, raw_image.pack(img.width, img.height, RAW_PALETTE, pixels))
+    else:
+        atomic_write.write_png(png_path, img)
+
+    # The JSON gets everything except the actual image data, which is in the
+    # PNG in the same order as the characters
+    structured['chars'] = [char.to_json(i) for (i, char) in enumerate(structured['chars'])]
+
+    atomic_write.write_json(json_path, structured)
+
+def load_edited_font(png_path, json_path):
+    # Reads an edited PNG + JSON pair back into the structure that
+    # make_sir0_from_dict takes, with characters sorted and checked
+    with open(png_path, 'rb') as f:
+        image_data = f.read()
+    structured = None
+    with open(json_path, 'r', encoding='utf-8') as f:
+        structured = json.load(f)
+    return parse_edited_font(image_data, structured)
+
+def parse_edited_font(image_data, structured):
+    # Same as load_edited_font, but with the image file (PNG or raw) already
+    # in memory (as bytes or a memoryview), and the JSON already parsed
+    from PIL import Image
+    atlas = None
+    if raw_image.is_raw(image_data):
+        (width, height, _, pixels) = raw_image.unpack(image_data)
+        img = Image.frombytes('L', (width, height), bytes(pixels).translate(L_FROM_RAW_PIXELS))
+        atlas = read_chars_from_image(img)
+    else:
+        with Image.open(BytesIO(image_data), formats=('PNG',)) as img:
+            atlas = read_chars_from_image(img)
+    del image_data
+
+    chars_list = [Glyph.from_json(char, i, atlas) for (i, char) in enumerate(structured['chars'])]
+    del atlas
+
+    chars_list.sort(key=operator.attrgetter('sort_key'))
+
+    # Ensure there are no duplicates
+    for i in range(len(chars_list) - 1):
+        if chars_list[i].code_bytes == chars_list[i + 1].code_bytes:
+            raise ValueError(f'Duplicate character codes in list of characters! For one character, {chars_list[i].describe()}, but for another character, {chars_list[i + 1].describe()}, which matches the first')
+
+    structured['chars'] = chars_list
+    return structured
+
+# One character of Shift-JIS text: a lead byte and whatever comes after it, or
+# a single byte
+SJIS_CHAR_PATTERN = re.compile(rb'[\x81-\x9F\xE0-\xFC][\x00-\xFF]|[\x00-\xFF]', re.DOTALL)
+
+def halfwidth_katakana_as_hiragana(code):
+    # 999 draws half-width katakana with the full-width hiragana glyphs, so
+    # those need to be kept too (see the README)
+    if len(code) != 1 or not 0xA6 <= code[0] <= 0xDD:
+        return None
+    kana = unicodedata.normalize('NFKC', code.decode('mskanji'))
+    if len(kana) != 1 or not 'ァ' <= kana <= 'ヶ':
+        return None
+    return chr(ord(kana) - 0x60).encode('mskanji')
+
+def collect_used_codes(strings, encoding):
+    # Encodes every distinct string once, and then finds all the characters in
+    # all of them with one pass over the joined bytes
+    encoded = []
+    for s in set(strings):
+        e = validate.encode_or_none(s, encoding)
+        if e is None:
+            print(f'WARNING: skipping characters that can\'t be encoded in {encoding}: {"".join(validate.unencodable_chars(s, encoding))}')
+            e = s.encode(encoding, errors='ignore')
+        encoded.append(e)
+    joined = b'\0'.join(encoded)
+
+    if encoding == 'mskanji':
+        codes = set(SJIS_CHAR_PATTERN.findall(joined))
+        codes.update({h for h in map(halfwidth_katakana_as_hiragana, list(codes)) if h is not None})
+    else:
+        codes = {bytes((b,)) for b in set(joined)}
+    codes.discard(b'\0')
+    return codes
+
+def subset(structured, used_codes):
+    # Returns a copy of the font with only the characters in `used_codes`
+    return {**structured, 'chars': [c for c in structured['chars'] if c.code_bytes in used_codes]}
 
 def print_usage(args):
     print('Usage:')
-    print(f'    python {args[0]} dump <kanji.dat> <output.png> <output.json>')
-    print(f'    python {args[0]} make <edited.png> <edited.json> <new-kanji.dat>')
+    print(f'    python {args[0]} dump <kanji.dat> <output.png | output.idx> <output.json>')
+    print(f'    python {args[0]} make <edited.png> <edited.json> <new-kanji.dat> [--trim] [--trim-width=<gap>]')
+    print(f'    python {args[0]} subset <edited.png> <edited.json> <new-kanji.dat> <tool> <edited.json> [<tool> <edited.json>...]')
+    print(f'        [--text=<script.txt>]... [--keep=<characters>] [--keep-bytes=<hex>,<hex>...] [--ptbr | --latin1] [--trim] [--trim-width=<gap>]')
 
 def main(args):
     if len(args) >= 2 and args[1] == 'dump':
@@ -275,96 +422,99 @@ def main(args):
         with open(args[2], 'rb') as f:
             kanji_dat = f.read()
 
-        structured = dump(kanji_dat)
-
-        img = build_image(structured, 32)
-        img.save(args[3], format='PNG')
-
-        # Remove the actual image data before outputting to JSON, and convert
-        # code_bytes fields to a string
-        for (i, char) in enumerate(structured['chars']):
-            del char['gfx']
-            char['gfx_pos'] = i
-            if 'code_bytes' in char:
-                char['code_bytes'] = char['code_bytes'].hex()
-
-        with open(args[4], 'w', encoding='utf-8', newline='\n') as f:
-            json.dump(structured, f, ensure_ascii=False, indent=4)
+        dump_to_files(kanji_dat, args[3], args[4])
     elif len(args) >= 2 and args[1] == 'make':
-        if len(args) != 5:
+        if len(args) < 5:
             print_usage(args)
             return 1
 
-        gfx_list = None
-        with Image.open(args[2], formats=('PNG',)) as img:
-            gfx_list = read_chars_from_image(img)
-        structured = None
-        with open(args[3], 'r', encoding='utf-8') as f:
-            structured = json.load(f)
-
-        chars_list = structured['chars']
-
-        # Add the image data to every character
-        for char in chars_list:
-            gfx_pos = char.pop('gfx_pos')
-            canvas_height = char['canvas_height']
-            char['gfx'] = gfx_list[gfx_pos][0:canvas_height*2]
-
-        del gfx_list
-
-        # Convert all SJIS codes to use the code_bytes field, and convert it into a bytes object
-        for (i, char) in enumerate(chars_list):
-            code = char.get('code')
-            if code is not None:
-                code_bytes = code.encode('mskanji')
-                if 'code_bytes' in char:
-                    if char['code_bytes'] == code_bytes:
-                        print(f"WARNING: redundant 'code_bytes' field in metadata for character {i} in list, with character code '{code}'")
-                    else:
-                        raise ValueError(f"Character {i} has 'code' and 'code_bytes' fields both set, to different values" + \
-                                         f"(code = {code} / {code_bytes}, code_bytes = {char['code_bytes']})." + \
-                                         "Please remove one of the fields.")
-                char['code_bytes'] = code_bytes
-            else:
-                if 'code_bytes' not in char:
-                    raise ValueError(f'No "code" or "code_bytes" field in character (index {i} in chars list)')
-                char['code_bytes'] = bytes.fromhex(char['code_bytes'])
-
-        # Sort characters by SJIS byte sequence (the game does a binary search)
-        def sjis_key(c):
-            code = c['code_bytes']
-            if len(code) == 1:
-                return b'\x00' + code
+        trim = False
+        width_gap = None
+        for arg in args[5:]:
+            if arg == '--trim':
+                trim = True
+            elif arg.startswith('--trim-width='):
+                trim = True
+                width_gap = int(arg[len('--trim-width='):])
             else:
-                return code
+                print_usage(args)
+                return 1
 
-        chars_list.sort(key=sjis_key)
+        structured = load_edited_font(args[2], args[3])
+        if trim:
+            saved = trim_glyphs(structured['chars'], width_gap)
+            print(f'Trimmed {saved} bytes of blank rows')
+        kanji_dat = make_sir0_from_dict(structured)
 
-        # Ensure there are no duplicates
-        for i in range(len(chars_list) - 1):
-            if chars_list[i]['code_bytes'] == chars_list[i + 1]['code_bytes']:
-                # Display a nice error message
-                char1_code = chars_list[i].get('code')
-                if char1_code is None:
-                    char1_code = f"code_bytes = {chars_list[i]['code_bytes']}"
-                else:
-                    char1_code = f"code = '{char1_code}'"
-                char2_code = chars_list[i + 1].get('code')
-                if char2_code is None:
-                    char2_code = f"code_bytes = {chars_list[i + 1]['code_bytes']}"
-                else:
-                    char2_code = f"code = '{char2_code}'"
-                raise ValueError(f'Duplicate character codes in list of characters! For one character, {char1_code}, but for another character, {char2_code}, which matches the first')
+        atomic_write.write(args[4], kanji_dat)
+    elif len(args) >= 2 and args[1] == 'subset':
+        display_encoding = None
+        text_paths = []
+        keep = ''
+        keep_bytes = set()
+        trim = False
+        width_gap = None
+        positionals = []
+        for arg in args[2:]:
+            if arg == '--ptbr' or arg == '--latin1':
+                display_encoding = 'latin_1'
+            elif arg == '--trim':
+                trim = True
+            elif arg.startswith('--trim-width='):
+                trim = True
+                width_gap = int(arg[len('--trim-width='):])
+            elif arg.startswith('--text='):
+                text_paths.append(arg[len('--text='):])
+            elif arg.startswith('--keep='):
+                keep += arg[len('--keep='):]
+            elif arg.startswith('--keep-bytes='):
+                keep_bytes.update(bytes.fromhex(h) for h in arg[len('--keep-bytes='):].split(',') if h != '')
+            else:
+                positionals.append(arg)
 
-        kanji_dat = make_sir0_from_dict(structured)
+        if len(positionals) < 5 or len(positionals) % 2 != 1:
+            print_usage(args)
+            return 1
 
-        with open(args[4], 'wb') as f:
-            f.write(kanji_dat)
+        # Display strings, grouped by the encoding they get written in
+        strings = {}
+        for i in range(3, len(positionals), 2):
+            tool = positionals[i]
+            if tool.endswith('.py'):
+                tool = tool[:-3]
+            if tool not in validate.TOOLS:
+                print(f'Unknown tool "{positionals[i]}" -- expected one of: {", ".join(validate.TOOLS)}')
+                return 1
+            with open(positionals[i + 1], 'r', encoding='utf-8') as f:
+                table = json.load(f)
+            encoding = validate.display_encoding_for(tool, display_encoding)
+            strings.setdefault(encoding, []).extend(s for (_, s, is_display) in validate.iter_strings(tool, table) if is_display)
+        for path in text_paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                strings.setdefault(display_encoding or 'mskanji', []).append(f.read())
+        # Like --text, these are characters for the text that gets displayed
+        strings.setdefault(display_encoding or 'mskanji', []).append(keep)
+
+        used_codes = set(keep_bytes)
+        for (encoding, encoding_strings) in strings.items():
+            used_codes |= collect_used_codes(encoding_strings, encoding)
+
+        structured = load_edited_font(positionals[0], positionals[1])
+        full_size = len(make_sir0_from_dict(structured))
+        small = subset(structured, used_codes)
+        if trim:
+            trim_glyphs(small['chars'], width_gap)
+        kanji_dat = make_sir0_from_dict(small)
+
+        atomic_write.write(positionals[2], kanji_dat)
+
+        print(f'Kept {len(small["chars"])} of {len(structured["chars"])} characters')
+        print(f'{positionals[2]} is {len(kanji_dat)} bytes, {full_size - len(kanji_dat)} bytes smaller than the full font')
     else:
         if len(args) == 1:
             print_usage(args)
             return 1
-        print(f'Invalid command "{args[1]}" -- expected "dump" or "make"')
+        print(f'Invalid command "{args[1]}" -- expected "dump," "make," or "subset"')
         return 1
 
 if __name__ == '__main__':
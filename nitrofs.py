@@ -0,0 +1,307 @@
+# Script to read files straight out of a .nds ROM image, without extracting it first
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import fnmatch
+import mmap
+import os
+import shutil
+import sys
+
+import atomic_write
+
+# The tables that `dump` knows how to convert, and where they are in the ROM
+TABLE_PATHS = ('etc/chara.dat', 'etc/file.dat', 'etc/room.dat', 'etc/camera.dat', 'etc/staff.dat')
+FONT_PATTERN = 'etc/kanji*.dat'
+
+class NitroFS:
+    # Parses the file name table (FNT) and file allocation table (FAT) of a ROM
+    # once, and then hands out memoryview slices of the memory-mapped ROM.
+    #
+    # Every memoryview has to be released (or just stop being used) before the
+    # NitroFS gets closed, or mmap will refuse to close.
+    def __init__(self, rom_path):
+        self.rom_path = rom_path
+        self._file = open(rom_path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            self._file.close()
+            raise
+        self.data = memoryview(self._mmap)
+
+        self.fnt_offset = int.from_bytes(self.data[0x40:0x44], 'little')
+        self.fat_offset = int.from_bytes(self.data[0x48:0x4C], 'little')
+        fat_size = int.from_bytes(self.data[0x4C:0x50], 'little')
+        self.file_count = fat_size // 8
+        # Path -> file ID, for every file that has a name (overlays don't)
+        self.paths = {}
+        self._read_directory(0xF000, '')
+
+    def _read_directory(self, dir_id, prefix):
+        fnt = self.fnt_offset
+        entry = fnt + (dir_id & 0xFFF) * 8
+        it = fnt + int.from_bytes(self.data[entry:entry+4], 'little')
+        file_id = int.from_bytes(self.data[entry+4:entry+6], 'little')
+
+        while True:
+            type_length = self.data[it]
+            it += 1
+            if type_length == 0:
+                break
+            name_length = type_length & 0x7F
+            name = bytes(self.data[it:it+name_length]).decode('mskanji')
+            it += name_length
+            if type_length & 0x80:
+                subdir_id = int.from_bytes(self.data[it:it+2], 'little')
+                it += 2
+                self._read_directory(subdir_id, prefix + name + '/')
+            else:
+                self.paths[prefix + name] = file_id
+                file_id += 1
+
+    def extent(self, path):
+        # Returns (start offset, end offset) of a file in the ROM
+        file_id = self.paths[path]
+        entry = self.fat_offset + file_id * 8
+        start = int.from_bytes(self.data[entry:entry+4], 'little')
+        end = int.from_bytes(self.data[entry+4:entry+8], 'little')
+        return (start, end)
+
+    def read(self, path):
+        # Returns a memoryview of the file's data, without copying anything
+        (start, end) = self.extent(path)
+        return self.data[start:end]
+
+    def glob(self, pattern):
+        return sorted(p for p in self.paths.keys() if fnmatch.fnmatchcase(p, pattern))
+
+    def close(self):
+        self.data.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Something still has a memoryview from read(), like the frames of
+            # an exception that's on its way out of a `with` block. Raising
+            # here would hide that exception, so the mapping gets closed
+            # whenever the last of those views goes away instead
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# Header fields that hold the offset of something in the ROM. Used to figure out
+# how much room there is after each file before something else starts
+HEADER_OFFSET_FIELDS = (0x20, 0x30, 0x40, 0x48, 0x50, 0x58, 0x68)
+ALIGNMENT = 0x200
+
+def crc16(data):
+    # CRC-16/MODBUS, which is what the header checksum uses
+    crc = 0xFFFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+def patch_rom(rom_path, output_path, replacements):
+    # Writes new data for some files into a copy of the ROM (or into the ROM
+    # itself, if both paths are the same). Files that still fit where the old
+    # file was get written over it; files that grew get moved to the end of the
+    # ROM (after anything past the used size, like a signature). Nothing else
+    # in the ROM gets touched, except for FAT entries and (if anything moved)
+    # the ROM size in the header.
+    #
+    # `replacements` maps paths in the ROM to their new data. Returns a list of
+    # (path, whether it had to be moved) pairs.
+    with NitroFS(rom_path) as rom:
+        for path in replacements.keys():
+            if path not in rom.paths:
+                raise KeyError(f'"{path}" is not in the ROM')
+        fat_offset = rom.fat_offset
+        file_ids = {path: rom.paths[path] for path in replacements.keys()}
+        fat = [(int.from_bytes(rom.data[fat_offset+i*8:fat_offset+i*8+4], 'little'),
+                int.from_bytes(rom.data[fat_offset+i*8+4:fat_offset+i*8+8], 'little'))
+               for i in range(rom.file_count)]
+        header = bytearray(rom.data[0:0x200])
+        rom_size = len(rom.data)
+
+    used_size = int.from_bytes(header[0x80:0x84], 'little')
+    # Whatever comes after the used size (like the RSA signature that
+    # download play checks) has to stay where it is, so moved files go after
+    # the end of the actual file instead
+    append_at = max(used_size, rom_size)
+    # Everything that starts somewhere in the ROM, sorted, so that the space
+    # available to a file goes up to the next thing after it
+    starts = sorted({start for (start, end) in fat if end > start} |
+                    {int.from_bytes(header[f:f+4], 'little') for f in HEADER_OFFSET_FIELDS} |
+                    {used_size})
+
+    if os.path.abspath(output_path) != os.path.abspath(rom_path):
+        shutil.copyfile(rom_path, output_path)
+
+    results = []
+    with open(output_path, 'r+b') as f:
+        for (path, data) in replacements.items():
+            file_id = file_ids[path]
+            (start, end) = fat[file_id]
+            room = min((s for s in starts if s > start), default=used_size) - start
+
+            moved = len(data) > room
+            if moved:
+                start = (append_at + ALIGNMENT - 1) & ~(ALIGNMENT - 1)
+                append_at = start + len(data)
+                used_size = append_at
+                f.seek(start)
+                f.write(data)
+            else:
+                f.seek(start)
+                f.write(data)
+                # Don't leave the end of the old file lying around
+                if len(data) < end - start:
+                    f.write(b'\xFF' * (end - start - len(data)))
+            fat[file_id] = (start, start + len(data))
+            f.seek(fat_offset + file_id * 8)
+            f.write(start.to_bytes(4, 'little') + (start + len(data)).to_bytes(4, 'little'))
+            results.append((path, moved))
+
+        if used_size != int.from_bytes(header[0x80:0x84], 'little'):
+            header[0x80:0x84] = used_size.to_bytes(4, 'little')
+            # Make the cartridge bigger if the ROM doesn't fit anymore
+            while (0x20000 << header[0x14]) < used_size:
+                header[0x14] += 1
+            header[0x15E:0x160] = crc16(header[0:0x15E]).to_bytes(2, 'little')
+            f.seek(0)
+            f.write(header[0:0x160])
+
+    return results
+
+def write_json(path, structured):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    atomic_write.write_json(path, structured)
+
+def dump_all(rom, output_dir, display_encoding, image_patterns):
+    # Converts everything we know how to convert, reading each file straight
+    # out of the mapped ROM
+    import camera_rooms
+    import chara
+    import file
+    import room_data
+    import staff_roll
+
+    dumpers = {
+        'etc/chara.dat': lambda data: chara.dump(data),
+        'etc/file.dat': lambda data: file.dump(data),
+        'etc/room.dat': lambda data: room_data.dump(data, display_encoding),
+        'etc/camera.dat': lambda data: camera_rooms.dump(data, display_encoding),
+        'etc/staff.dat': lambda data: staff_roll.dump(data, display_encoding or 'mskanji'),
+    }
+    for path in TABLE_PATHS:
+        if path in rom.paths:
+            write_json(os.path.join(output_dir, path[:-4] + '.json'), dumpers[path](rom.read(path)))
+            print(f'Dumped {path}')
+
+    fonts = rom.glob(FONT_PATTERN)
+    images = sorted({p for pattern in image_patterns for p in rom.glob(pattern)})
+    if len(fonts) == 0 and len(images) == 0:
+        return
+
+    # Only needed for fonts and images, and it's the slowest import by far
+    import bg_files
+    import font
+
+    for path in fonts:
+        base = os.path.join(output_dir, path[:-4])
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        font.dump_to_files(rom.read(path), base + '.png', base + '.json')
+        print(f'Dumped {path}')
+
+    for path in images:
+        out_path = os.path.join(output_dir, path[:-4] + '.png')
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        atomic_write.write_png(out_path, bg_files.dump_image(rom.read(path)))
+        print(f'Dumped {path}')
+
+def print_usage(args):
+    print('Usage:')
+    print(f'    python {args[0]} list <rom.nds> [<pattern>]')
+    print(f'    python {args[0]} extract <rom.nds> <path-in-rom> <output-file>')
+    print(f'    python {args[0]} dump <rom.nds> <output-folder> [--ptbr] [--images=<pattern>]...')
+    print(f'    python {args[0]} patch <rom.nds> <output.nds> <path-in-rom>=<new-file> [<path-in-rom>=<new-file>...]')
+
+def main(args):
+    if len(args) >= 2 and args[1] == 'list':
+        if len(args) != 3 and len(args) != 4:
+            print_usage(args)
+            return 1
+
+        pattern = args[3] if len(args) == 4 else '*'
+        with NitroFS(args[2]) as rom:
+            for path in rom.glob(pattern):
+                (start, end) = rom.extent(path)
+                print(f'{path} (0x{start:X}-0x{end:X}, {end - start} bytes)')
+    elif len(args) >= 2 and args[1] == 'extract':
+        if len(args) != 5:
+            print_usage(args)
+            return 1
+
+        with NitroFS(args[2]) as rom:
+            if args[3] not in rom.paths:
+                print(f'"{args[3]}" is not in the ROM')
+                return 1
+            data = rom.read(args[3])
+            atomic_write.write(args[4], data)
+            data.release()
+    elif len(args) >= 2 and args[1] == 'dump':
+        if len(args) < 4:
+            print_usage(args)
+            return 1
+
+        display_encoding = None
+        image_patterns = []
+        for arg in args[4:]:
+            if arg == '--ptbr':
+                display_encoding = 'latin_1'
+            elif arg.startswith('--images='):
+                image_patterns.append(arg[len('--images='):])
+            else:
+                print_usage(args)
+                return 1
+
+        with NitroFS(args[2]) as rom:
+            dump_all(rom, args[3], display_encoding, image_patterns)
+        print(atomic_write.format_stats(*atomic_write.stats()))
+    elif len(args) >= 2 and args[1] == 'patch':
+        if len(args) < 5:
+            print_usage(args)
+            return 1
+
+        replacements = {}
+        for arg in args[4:]:
+            if '=' not in arg:
+                print_usage(args)
+                return 1
+            (rom_path, new_path) = arg.split('=', 1)
+            with open(new_path, 'rb') as f:
+                replacements[rom_path] = f.read()
+
+        for (path, moved) in patch_rom(args[2], args[3], replacements):
+            print(f'{path}: {"moved to the end of the ROM" if moved else "written in place"}')
+    else:
+        if len(args) == 1:
+            print_usage(args)
+            return 1
+        print(f'Invalid command "{args[1]}" -- expected "list," "extract," "dump," or "patch"')
+        return 1
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
@@ -0,0 +1,52 @@
+# Uncompressed indexed image format, for scripts that edit images without an image editor
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+# PNG is nice for people, but compressing and decompressing it is most of the
+# time it takes to dump an image and put it back. A raw image is just:
+#
+# 0x00: "IDX8"
+# 0x04: u16 width
+# 0x06: u16 height
+# 0x08: u16 number of palette colors
+# 0x0A: 6 bytes of zeroes
+# 0x10: the palette, as 15-bit DS colors (2 bytes each, same as in the .dat files)
+# then: one byte per pixel (palette index), left to right, top to bottom
+#
+# So for backgrounds, the palette and pixels are exactly the bytes from the .dat file.
+MAGIC = b'IDX8'
+HEADER_SIZE = 0x10
+EXTENSION = '.idx'
+
+def is_raw(data):
+    return data[0:4] == MAGIC
+
+def is_raw_path(path):
+    return path.lower().endswith(EXTENSION)
+
+def pack(width, height, palette, pixels):
+    # `palette` is the DS palette bytes (2 bytes per color)
+    if len(palette) % 2 != 0 or len(palette) > 512:
+        raise ValueError(f'Bad palette size {len(palette)} -- must be 2 bytes per color, up to 256 colors')
+    if len(pixels) != width * height:
+        raise ValueError(f'Image is {width}x{height}, but has {len(pixels)} pixels')
+    return b''.join((MAGIC, width.to_bytes(2, 'little'), height.to_bytes(2, 'little'),
+                     (len(palette) // 2).to_bytes(2, 'little'), bytes(6), palette, pixels))
+
+def unpack(data):
+    # Returns (width, height, palette, pixels), with the palette and pixels as
+    # memoryviews of `data`, so nothing gets copied
+    if not is_raw(data):
+        raise RuntimeError('Not a raw indexed image')
+    width = int.from_bytes(data[4:6], 'little')
+    height = int.from_bytes(data[6:8], 'little')
+    colors = int.from_bytes(data[8:10], 'little')
+    if colors > 256:
+        raise RuntimeError(f'Raw image has {colors} colors, but can have up to 256')
+    palette_end = HEADER_SIZE + colors * 2
+    if len(data) != palette_end + width * height:
+        raise RuntimeError(f'Raw image should be {palette_end + width * height} bytes, but is {len(data)} bytes')
+    view = memoryview(data)
+    return (width, height, view[HEADER_SIZE:palette_end], view[palette_end:])
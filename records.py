@@ -0,0 +1,303 @@
+# Declarative descriptions of the record layouts in etc/*.dat tables
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import struct
+import sys
+
+import sir0
+import string_cache
+
+# A record is a list of 32-bit fields. Each field is one of these kinds:
+
+# Pointer to a Shift-JIS string (an id, variable name, etc.)
+STR = 'str'
+# Pointer to a string that gets shown to the player, in the display encoding
+DISPLAY_STR = 'display_str'
+# Plain 32-bit number
+U32 = 'u32'
+
+class PointerList:
+    # Pointer to a null-terminated list of pointers to strings. The lists get
+    # written to their own section of the file
+    def __init__(self, item, section):
+        assert item == STR or item == DISPLAY_STR
+        self.item = item
+        self.section = section
+
+class RecordList:
+    # Pointer to a list of records, one after another, that ends with a single
+    # null word where the next record's first field would be
+    def __init__(self, record, section):
+        self.record = record
+        self.section = section
+
+class StringTable:
+    # Reads the strings of a table file. Strings that lots of records point to
+    # (ids, variables, sound effects) only get searched for and decoded once
+    # per encoding.
+    #
+    # Splitting the whole string region at the nulls ahead of time was tried,
+    # but on tables where every pointer has its own string (like the ones
+    # Sir0Builder writes), building that index took longer than just finding
+    # each string's end when it's read
+    def __init__(self, data, start, display_encoding):
+        # `start` is where the first string is (right after the SIR0 header)
+        self.data = data
+        self.start = start
+        # Where in the file the pointers that got followed are, so they can be
+        # compared with the pointer metadata (see Table.pointer_locs)
+        self.pointer_locs = set()
+        # Offset -> string, one dict per encoding
+        self._decoded = {}
+        self.read_str = self._reader('mskanji')
+        self.read_display_str = self._reader(display_encoding)
+
+    def _reader(self, encoding):
+        # Returns a function that takes an offset and returns the string there
+        decoded = self._decoded.setdefault(encoding, {})
+        data = self.data
+        def read(offset):
+            s = decoded.get(offset)
+            if s is None:
+                s = decoded[offset] = data[offset:data.find(0, offset)].decode(encoding)
+            return s
+        return read
+
+    def mid_string(self):
+        # Returns the offsets of strings that were read from the middle of
+        # another string, instead of its start. Sir0Builder never writes
+        # those, so they mean the file is broken, or was made by something else
+        data = self.data
+        offsets = set()
+        for decoded in self._decoded.values():
+            offsets.update(o for o in decoded.keys() if o > self.start and data[o - 1] != 0)
+        return sorted(offsets)
+
+    def warn(self):
+        offsets = self.mid_string()
+        if len(offsets) != 0:
+            shown = ', '.join(f'0x{o:X}' for o in offsets)
+            print(f'Warning: {len(offsets)} pointers point to the middle of a string instead of its start: {shown}', file=sys.stderr)
+
+class Record:
+    def __init__(self, *fields):
+        # `fields` is a list of (name, kind) pairs, in the order they're stored
+        self.fields = fields
+        self.struct = struct.Struct('<' + 'I' * len(fields))
+        self.size = self.struct.size
+        # Offsets of the fields that are pointers, from the start of the record
+        self.pointer_fields = [i * 4 for (i, (_, kind)) in enumerate(fields) if kind != U32]
+        self.sections = []
+        for (_, kind) in fields:
+            if isinstance(kind, (PointerList, RecordList)):
+                if isinstance(kind, RecordList):
+                    for section in kind.record.sections:
+                        if section not in self.sections:
+                            self.sections.append(section)
+                if kind.section not in self.sections:
+                    self.sections.append(kind.section)
+        self._decoders = [(name, self._compile_decoder(kind)) for (name, kind) in fields]
+        self._encoders = [(name, self._compile_encoder(kind)) for (name, kind) in fields]
+
+    # Each field gets turned into a small function ahead of time, so reading or
+    # writing a record doesn't have to figure out what each field is every time
+
+    @staticmethod
+    def _compile_decoder(kind):
+        if kind == STR:
+            return lambda strings, value, limit, encoding: strings.read_str(value)
+        if kind == DISPLAY_STR:
+            return lambda strings, value, limit, encoding: strings.read_display_str(value)
+        if kind == U32:
+            return lambda strings, value, limit, encoding: value
+        if isinstance(kind, PointerList):
+            return lambda strings, value, limit, encoding: read_pointer_list(strings, value, kind.item, limit, encoding)
+        if isinstance(kind, RecordList):
+            return lambda strings, value, limit, encoding: kind.record.read_list(strings, value, limit, encoding)
+        raise ValueError(f'Unknown field kind {kind!r}')
+
+    @staticmethod
+    def _compile_encoder(kind):
+        if kind == STR:
+            def encode_str(builder, section, value, encoding, shared):
+                builder.add_pointer(section, '.str', builder.add_string(string_cache.encode(value, 'mskanji')))
+            return encode_str
+        if kind == DISPLAY_STR:
+            def encode_display_str(builder, section, value, encoding, shared):
+                builder.add_pointer(section, '.str', builder.add_string(string_cache.encode(value, encoding)))
+            return encode_display_str
+        if kind == U32:
+            return lambda builder, section, value, encoding, shared: builder.add_u32(section, value)
+        if isinstance(kind, PointerList):
+            def encode_pointer_list(builder, section, value, encoding, shared):
+                if shared is not None:
+                    key = (kind.section, kind.item, tuple(value))
+                    if key in shared:
+                        builder.add_pointer(section, kind.section, shared[key])
+                        return
+                    shared[key] = len(builder.sections[kind.section])
+                item_encoding = encoding if kind.item == DISPLAY_STR else 'mskanji'
+                builder.add_pointer(section, kind.section, len(builder.sections[kind.section]))
+                for s in value:
+                    builder.add_pointer(kind.section, '.str', builder.add_string(string_cache.encode(s, item_encoding)))
+                # Null pointers don't get pointer metadata, since that would make them
+                # no longer look like null/0 after the file is loaded
+                builder.add_u32(kind.section, 0)
+            return encode_pointer_list
+        if isinstance(kind, RecordList):
+            def encode_record_list(builder, section, value, encoding, shared):
+                if shared is not None:
+                    key = (kind.section, id(kind.record), kind.record.freeze_list(value))
+                    if key in shared:
+                        builder.add_pointer(section, kind.section, shared[key])
+                        return
+                    shared[key] = len(builder.sections[kind.section])
+                builder.add_pointer(section, kind.section, len(builder.sections[kind.section]))
+                kind.record.write_list(builder, kind.section, value, encoding, shared)
+            return encode_record_list
+        raise ValueError(f'Unknown field kind {kind!r}')
+
+    def freeze_list(self, objs):
+        # Hashable version of a list of these records, with only the fields
+        # that actually get written
+        return tuple(tuple(freeze(obj[name]) for (name, _) in self.fields) for obj in objs)
+
+    def read(self, strings, offset, limit, encoding):
+        # `strings` is the file's StringTable, and `limit` is the start of the
+        # main data. Pointers always point before it
+        values = self.struct.unpack_from(strings.data, offset)
+        for ((name, kind), value) in zip(self.fields, values):
+            if kind != U32 and not 0x10 <= value < limit:
+                raise RuntimeError(f'Field "{name}" of record at 0x{offset:X} has bad pointer 0x{value:X}')
+        strings.pointer_locs.update(offset + f for f in self.pointer_fields)
+        return {name: decode(strings, value, limit, encoding) for ((name, decode), value) in zip(self._decoders, values)}
+
+    def read_list(self, strings, offset, limit, encoding):
+        data = strings.data
+        records = []
+        while int.from_bytes(data[offset:offset+4], 'little') != 0:
+            records.append(self.read(strings, offset, limit, encoding))
+            offset += self.size
+        return records
+
+    def write(self, builder, section, obj, encoding, shared=None):
+        # `shared` is a dict for remembering where lists were already written,
+        # so identical lists can be written once and pointed to from every
+        # record that has them. None means every list gets its own copy
+        for (name, encode) in self._encoders:
+            encode(builder, section, obj[name], encoding, shared)
+
+    def write_list(self, builder, section, objs, encoding, shared=None):
+        for obj in objs:
+            self.write(builder, section, obj, encoding, shared)
+        # Add extra null pointer at the end of the list, to mark the end
+        builder.add_u32(section, 0)
+
+def freeze(value):
+    # Hashable copy of a field's value from JSON (a number, string, list of
+    # strings or list of records)
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for (k, v) in value.items()))
+    return value
+
+def read_pointer_list(strings, offset, item, limit, encoding):
+    data = strings.data
+    read = strings.read_display_str if item == DISPLAY_STR else strings.read_str
+    items = []
+    while True:
+        ptr = int.from_bytes(data[offset:offset+4], 'little')
+        if ptr == 0:
+            break
+        if not 0x10 <= ptr < limit:
+            raise RuntimeError(f'Pointer list at 0x{offset:X} has bad pointer 0x{ptr:X}')
+        strings.pointer_locs.add(offset)
+        items.append(read(ptr))
+        offset += 4
+    return items
+
+class Table:
+    # The main data of a table file: a list of records that ends with a null
+    # word, followed by a pointer back to the start of the list (which is also
+    # the end of everything before it), and then `padding_words` zeroes
+    def __init__(self, record, padding_words=0):
+        self.record = record
+        self.padding_words = padding_words
+        self.section_names = ['.str', *record.sections, '.main']
+
+    def read(self, data, encoding=None):
+        if encoding is None:
+            encoding = 'mskanji'
+        (records, strings) = self._read(data, encoding)
+        strings.warn()
+        return records
+
+    def pointer_locs(self, data):
+        # Returns where every pointer in the file should be, going by the
+        # layout: the two in the SIR0 header, plus every pointer that read()
+        # follows. The file's pointer metadata should list exactly these (see
+        # sir0.verify). Latin-1 can decode anything, so display strings in any
+        # encoding can be read
+        (_, strings) = self._read(data, 'latin_1')
+        return {4, 8} | strings.pointer_locs
+
+    def _read(self, data, encoding):
+        # Returns (records, the StringTable that read them)
+        if data[0:3] != b'SIR':
+            raise RuntimeError('File is not a SIR0 or SIR1 file')
+        if data[3:4] != b'0':
+            raise RuntimeError('Unsupported SIR{X} version -- only SIR0 (32-bit pointers) is supported for now')
+
+        main_data = int.from_bytes(data[4:8], 'little')
+        # The pointer metadata gets checked separately, by sir0.py
+
+        # memoryviews (like the ones nitrofs.py hands out) can't search for the
+        # end of a string, and the tables are small enough to just copy
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+
+        strings = StringTable(data, 0x10, encoding)
+        records = self.record.read_list(strings, main_data, main_data, encoding)
+        end_ptr = main_data + len(records) * self.record.size + 4
+        if int.from_bytes(data[end_ptr:end_ptr+4], 'little') != main_data:
+            raise RuntimeError('Table does not end with a pointer to the start of the main data')
+        strings.pointer_locs.add(end_ptr)
+        return (records, strings)
+
+    def write(self, objs, encoding=None, share_lists=False):
+        # With `share_lists`, lists (of records or of strings) that are exactly
+        # the same as one that was already written point to that one instead
+        # of being written again. That makes the file smaller, and gives the
+        # game fewer pointers to fix up when it loads the file
+        if encoding is None:
+            encoding = 'mskanji'
+        shared = {} if share_lists else None
+        builder = sir0.Sir0Builder(self.section_names)
+        for obj in objs:
+            self.record.write(builder, '.main', obj, encoding, shared)
+        # First a null pointer
+        builder.add_u32('.main', 0)
+        # Then a pointer to the beginning of the main data
+        builder.add_pointer('.main', '.main', 0)
+        for _ in range(self.padding_words):
+            builder.add_u32('.main', 0)
+        return builder.build()
+
+def iter_strings(record, objs, path='$'):
+    # Yields (JSON path, field name, string, whether it's a display string) for
+    # every string in a list of records, including the ones in nested lists
+    for (i, obj) in enumerate(objs):
+        for (name, kind) in record.fields:
+            value = obj[name]
+            field_path = f'{path}[{i}].{name}'
+            if kind == STR or kind == DISPLAY_STR:
+                yield (field_path, name, value, kind == DISPLAY_STR)
+            elif isinstance(kind, PointerList):
+                for (j, s) in enumerate(value):
+                    yield (f'{field_path}[{j}]', name, s, kind.item == DISPLAY_STR)
+            elif isinstance(kind, RecordList):
+                yield from iter_strings(kind.record, value, field_path)
@@ -0,0 +1,259 @@
+# Script to build and check SIR0 files
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import os
+import sys
+
+# SIR0 files end with a list of every location in the file that holds a pointer,
+# so the game can turn them from file offsets into real addresses after loading
+# the file. Each entry is the distance from the previous location (or from the
+# start of the file, for the first one), written as a big-endian number with 7
+# bits per byte, where the top bit of each byte means "more bytes follow." The
+# list ends with a 0 byte.
+
+def read_pointer_offsets(data):
+    # Returns (list of pointer locations, index just past the end of the list)
+    table_offset = int.from_bytes(data[8:12], 'little')
+    locs = []
+    loc = 0
+    value = 0
+    i = table_offset
+    end = len(data)
+    while i < end:
+        b = data[i]
+        i += 1
+        value = (value << 7) | (b & 0x7F)
+        if b & 0x80:
+            continue
+        if value == 0:
+            return (locs, i)
+        loc += value
+        locs.append(loc)
+        value = 0
+    raise ValueError('Pointer metadata runs past the end of the file')
+
+def encode_pointer_offsets(locs):
+    # The opposite of read_pointer_offsets. `locs` must be sorted
+    out = bytearray()
+    d = bytearray()
+    previous = 0
+    for loc in locs:
+        delta = loc - previous
+        previous = loc
+        d.clear()
+        while delta != (delta & 0x7F):
+            d.append(delta & 0x7F)
+            delta >>= 7
+        d.append(delta)
+        d.reverse()
+        for i in range(len(d) - 1):
+            d[i] |= 0x80
+        out.extend(d)
+    out.append(0)
+    return out
+
+class Sir0Builder:
+    # Puts together a SIR0 file out of sections, which get laid out one after
+    # another in the order they're given, right after the 0x10-byte header. The
+    # last section is the "main" data that the header points to.
+    #
+    # Pointers are written as an offset into their target section, and get
+    # fixed up once the size of every section is known.
+    def __init__(self, section_names):
+        self.section_names = section_names
+        self.sections = {name: bytearray() for name in section_names}
+        self.pointers = []
+
+    def add_u32(self, section, value):
+        self.sections[section].extend(value.to_bytes(4, 'little'))
+
+    def add_pointer(self, section, target_section, target_offset):
+        data = self.sections[section]
+        self.pointers.append((section, len(data), target_section))
+        data.extend(target_offset.to_bytes(4, 'little'))
+
+    def add_string(self, encoded):
+        # Returns the offset of the string in the '.str' section
+        data = self.sections['.str']
+        offset = len(data)
+        data.extend(encoded)
+        return offset
+
+    def build(self):
+        sir_header_size = 0x10
+
+        # Align every section but the last to a multiple of 4 bytes if necessary
+        section_starts = {}
+        pos = sir_header_size
+        for name in self.section_names:
+            data = self.sections[name]
+            if name != self.section_names[-1]:
+                data.extend(b'\xAA' * ((4 - len(data) % 4) % 4))
+            section_starts[name] = pos
+            pos += len(data)
+        main_start = section_starts[self.section_names[-1]]
+
+        # Fix the literal addresses of all pointers so that they match their pointees' file addresses
+        pointer_locs = [4, 8]
+        for (section, p, target_section) in self.pointers:
+            data = self.sections[section]
+            old_pointer = int.from_bytes(data[p:p+4], 'little')
+            data[p:p+4] = (old_pointer + section_starts[target_section]).to_bytes(4, 'little')
+            pointer_locs.append(section_starts[section] + p)
+        pointer_locs.sort()
+
+        out_file_data = bytearray()
+        out_file_data.extend(b'SIR0')
+        out_file_data.extend(main_start.to_bytes(4, 'little'))
+        out_file_data.extend(((pos + 0xF) & ~0xF).to_bytes(4, 'little'))
+        out_file_data.extend(b'\x00\x00\x00\x00')
+        for name in self.section_names:
+            out_file_data.extend(self.sections[name])
+        while len(out_file_data) % 16 != 0:
+            out_file_data.append(0xAA)
+
+        # Now, finally, add the pointer metadata
+        out_file_data.extend(encode_pointer_offsets(pointer_locs))
+        while len(out_file_data) % 16 != 0:
+            out_file_data.append(0xAA)
+
+        # Only catches pointers that point outside of the file or aren't
+        # aligned. The pointer list comes from the same place as the pointers,
+        # so comparing the two wouldn't catch anything
+        check(out_file_data)
+
+        return out_file_data
+
+def verify(data, expected_pointer_locs=None):
+    # Returns a list of everything that's wrong with the file's pointers. If
+    # `expected_pointer_locs` is given (like from records.Table.pointer_locs),
+    # also checks that the pointer metadata lists exactly those locations
+    if data[0:4] != b'SIR0':
+        return ['File is not a SIR0 file']
+    if len(data) < 0x10:
+        return ['File is too small to hold a SIR0 header']
+
+    problems = []
+    main_data = int.from_bytes(data[4:8], 'little')
+    table_offset = int.from_bytes(data[8:12], 'little')
+    if not 0x10 <= table_offset < len(data):
+        return [f'Pointer metadata offset 0x{table_offset:X} is outside of the file']
+    if not 0x10 <= main_data < table_offset:
+        problems.append(f'Main data offset 0x{main_data:X} is outside of the data region')
+
+    try:
+        (locs, end) = read_pointer_offsets(data)
+    except ValueError as e:
+        return problems + [str(e)]
+
+    if locs[0:2] != [4, 8]:
+        problems.append('Pointer metadata should start with the two header pointers (0x4 and 0x8)')
+    for i in range(len(data) - 1, end - 1, -1):
+        if data[i] != 0xAA:
+            problems.append(f'Unexpected data after the end of the pointer metadata, at 0x{i:X}')
+            break
+
+    for loc in locs:
+        if loc % 4 != 0:
+            problems.append(f'Pointer at 0x{loc:X} is not 4-byte aligned')
+        if loc + 4 > table_offset:
+            problems.append(f'Pointer at 0x{loc:X} is outside of the data region')
+            continue
+        if loc == 8:
+            # This one points at the pointer metadata itself
+            continue
+        value = int.from_bytes(data[loc:loc+4], 'little')
+        if not 0x10 <= value <= table_offset:
+            problems.append(f'Pointer at 0x{loc:X} has value 0x{value:X}, which is outside of the data region')
+
+    if expected_pointer_locs is not None:
+        actual = set(locs)
+        expected = set(expected_pointer_locs)
+        for loc in sorted(expected - actual):
+            problems.append(f'Pointer at 0x{loc:X} is missing from the pointer metadata')
+        for loc in sorted(actual - expected):
+            problems.append(f'Pointer metadata lists 0x{loc:X}, which is not a pointer')
+
+    return problems
+
+def check(data):
+    # For use right after writing a file: raises an error if anything's wrong
+    problems = verify(data)
+    if len(problems) != 0:
+        raise RuntimeError('Built a broken SIR0 file:\n' + '\n'.join(problems))
+
+# Table files whose layout is known (see records.py), by file name -> (module,
+# table). For these, the pointer metadata also gets compared with where the
+# layout says the pointers are
+TABLES = {
+    'chara.dat': ('chara', 'CHARA_TABLE'),
+    'file.dat': ('file', 'FILE_TABLE'),
+    'room.dat': ('room_data', 'ROOM_TABLE'),
+    'camera.dat': ('camera_rooms', 'CAMERA_TABLE'),
+    'staff.dat': ('staff_roll', 'STAFF_TABLE'),
+}
+
+def find_table(name):
+    # `name` is a file name like "chara.dat", or a tool name like "chara"
+    import importlib
+    for (file_name, (module, table)) in TABLES.items():
+        if name == file_name or name == module:
+            return getattr(importlib.import_module(module), table)
+    return None
+
+def print_usage(args):
+    print('Usage:')
+    print(f'    python {args[0]} verify [--table=<tool>] <file.dat> [<file.dat>...]')
+
+def main(args):
+    if len(args) >= 2 and args[1] == 'verify':
+        table_name = None
+        paths = []
+        for arg in args[2:]:
+            if arg.startswith('--table='):
+                table_name = arg[len('--table='):]
+                if find_table(table_name) is None:
+                    print(f'Unknown table "{table_name}" -- expected one of: {", ".join(m for (m, _) in TABLES.values())}')
+                    return 1
+            else:
+                paths.append(arg)
+        if len(paths) == 0:
+            print_usage(args)
+            return 1
+
+        result = 0
+        for path in paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data[0:4] in (b'AT3P', b'AT4P', b'AT5P', b'AT6P'):
+                import bg_files
+                data = bg_files.decompress(data)
+
+            problems = []
+            expected = None
+            table = find_table(table_name or os.path.basename(path).lower())
+            if table is not None:
+                try:
+                    expected = table.pointer_locs(data)
+                except (RuntimeError, UnicodeDecodeError) as e:
+                    problems.append(f'Could not read the table to find its pointers: {e}')
+            problems += verify(data, expected)
+            if len(problems) == 0:
+                print(f'{path}: OK')
+            else:
+                result = 1
+                for problem in problems:
+                    print(f'{path}: {problem}')
+        return result
+    else:
+        if len(args) == 1:
+            print_usage(args)
+            return 1
+        print(f'Invalid command "{args[1]}" -- expected "verify"')
+        return 1
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
@@ -1,131 +1,38 @@
 # Script to convert back and forth between etc/staff.dat and JSON file
 # for 999: Nine Hours, Nine Persons, Nine Doors (DS)
 # by PhoenixBound
-# Last updated: 2025-03-21
+# Last updated: 2026-10-19
 
 import json
 import sys
 
-def read_str(data, offset):
-    end_index = data.find(0, offset)
-    return data[offset:end_index].decode('mskanji')
+import atomic_write
+import records
 
-def read_display_str(data, offset, encoding):
-    end_index = data.find(0, offset)
-    if encoding is None:
-        encoding = 'mskanji'
-    return data[offset:end_index].decode(encoding)
-
-def to_encoded_str(s):
-    return s.encode('mskanji') + b'\0'
-
-def to_encoded_display_str(s, encoding):
-    if encoding is None:
-        encoding = 'mskanji'
-    return s.encode(encoding) + b'\0'
-
-def read_credits_list(data, offset, encoding):
+def read_credits_list(strings, offset, encoding):
+    # `strings` is a records.StringTable, so lines that several endings point
+    # to (blank ones, names that show up in every ending) only get decoded once
+    data = strings.data
     i = offset
     lines = []
     while True:
-        text = read_str(data, int.from_bytes(data[i:i+4], 'little'))
+        text = strings.read_str(int.from_bytes(data[i:i+4], 'little'))
         lines.append(text)
         i += 4
         if text == '[E]':
             break
     return lines
 
+# Pairs of ending IDs and lists of credits lines. (The lines are read until the
+# [E] command by read_credits_list, instead of going by the null pointer)
+ENDING_RECORD = records.Record(
+    ('id', records.STR),
+    ('credits', records.PointerList(records.DISPLAY_STR, '.credits')),
+)
+STAFF_TABLE = records.Table(ENDING_RECORD)
+
 def make_sir0_from_dict(thing, display_encoding):
-    string_data = bytearray()
-    credits_ptrs = []
-    credits_pointer_locs = []
-    main_ptrs = []
-    main_pointer_locs = []
-    
-    sir_header_size = 0x10
-    
-    for (k, v) in thing.items():
-        # Add id string (we'll fix the pointer later)
-        main_pointer_locs.append((len(main_ptrs) * 4, '.str'))
-        main_ptrs.append(len(string_data))
-        string_data.extend(to_encoded_str(k))
-        
-        # Add pointer to list
-        main_pointer_locs.append((len(main_ptrs) * 4, '.credits'))
-        main_ptrs.append(len(credits_ptrs) * 4)
-        for s in v:
-            # Add strings for all the credits entries
-            credits_pointer_locs.append((len(credits_ptrs) * 4, '.str'))
-            credits_ptrs.append(len(string_data))
-            string_data.extend(to_encoded_display_str(s, display_encoding))
-        # Add extra null pointer at the end of each credits list
-        # TODO: do we need to add pointer metadata for this...?
-        credits_ptrs.append(0)
-    
-    # Align string_data to a multiple of 4 bytes if necessary
-    string_data.extend(b'\xAA' * ((4 - len(string_data) % 4) % 4))
-    
-    # Add the rest of the main data
-    # First the null id string
-    main_ptrs.append(0)
-    # Then the pointer past the end of the credits string table
-    main_pointer_locs.append((len(main_ptrs) * 4, '.credits'))
-    main_ptrs.append(len(credits_ptrs) * 4)
-    
-    
-    for (p, t) in credits_pointer_locs:
-        assert t == '.str'
-        credits_ptrs[p // 4] += sir_header_size
-
-    for (p, t) in main_pointer_locs:
-        if t == '.str':
-            main_ptrs[p // 4] += sir_header_size
-        elif t == '.credits':
-            main_ptrs[p // 4] += sir_header_size + len(string_data)
-
-    pointer_locs = [4, 8]
-    pointer_locs.extend([x[0] + sir_header_size + len(string_data) for x in credits_pointer_locs])
-    pointer_locs.extend([x[0] + sir_header_size + len(string_data) + len(credits_ptrs)*4 for x in main_pointer_locs])
-    
-    # Go through every entry (except the first one) in pointer_locs starting from the end
-    i = len(pointer_locs) - 1 
-    while i > 0:
-        # Turn it into the distance from the previous pointer location
-        pointer_locs[i] -= pointer_locs[i - 1]
-        i -= 1
-    
-    out_file_data = bytearray()
-    out_file_data.extend(b'SIR0')
-    out_file_data.extend((sir_header_size + len(string_data) + len(credits_ptrs)*4).to_bytes(4, 'little'))
-    out_file_data.extend(((sir_header_size + len(string_data) + len(credits_ptrs)*4 + len(main_ptrs)*4 + 0xF) & ~0xF).to_bytes(4, 'little'))
-    out_file_data.extend(b'\x00\x00\x00\x00')
-    out_file_data.extend(string_data)
-    for x in credits_ptrs:
-        out_file_data.extend(x.to_bytes(4, 'little'))
-    for x in main_ptrs:
-        out_file_data.extend(x.to_bytes(4, 'little'))
-    while len(out_file_data) % 16 != 0:
-        out_file_data.append(0xAA)
-
-    # Now, finally, add the pointer metadata
-    d = bytearray()
-    for loc in pointer_locs:
-        d.clear()
-        while loc != (loc & 0x7F):
-            d.append(loc & 0x7F)
-            loc >>= 7
-        d.append(loc)
-        d.reverse()
-        for i in range(len(d) - 1):
-            d[i] |= 0x80
-        out_file_data.extend(d)
-    del d
-    out_file_data.append(0)
-
-    while len(out_file_data) % 16 != 0:
-        out_file_data.append(0xAA)
-
-    return out_file_data
+    return STAFF_TABLE.write([{'id': k, 'credits': v} for (k, v) in thing.items()], display_encoding)
 
 def dump(staff_dat, display_encoding=None):
     if staff_dat[0:3] != b'SIR':
@@ -136,6 +43,10 @@ def dump(staff_dat, display_encoding=None):
     main_data = int.from_bytes(staff_dat[4:8], 'little')
     # We ignore the pointer metadata because we're cool like that
 
+    # memoryviews can't search for the end of a string, and the file is tiny
+    if isinstance(staff_dat, memoryview):
+        staff_dat = staff_dat.tobytes()
+
     # Read all the pairs of credits IDs and credits pointers
     endings = []
     header_ptr = main_data
@@ -153,10 +64,13 @@ def dump(staff_dat, display_encoding=None):
         header_ptr += 8
 
     # Then turn it into the structure that will make a good JSON, and make a dict out of that
-    return {                                                                       \
-        read_str(staff_dat, id): read_credits_list(staff_dat, c, display_encoding) \
-        for (id, c) in endings                                                     \
+    strings = records.StringTable(staff_dat, 0x10, display_encoding)
+    structured = {                                                                   \
+        strings.read_str(id): read_credits_list(strings, c, display_encoding) \
+        for (id, c) in endings                                                       \
     }
+    strings.warn()
+    return structured
 
 
 def main(args):
@@ -180,8 +94,7 @@ def main(args):
 
         endings_structured = dump(staff_dat, display_encoding)
 
-        with open(args[3], 'w', encoding='utf-8', newline='\n') as f:
-            json.dump(endings_structured, f, ensure_ascii=False, indent=4)
+        atomic_write.write_json(args[3], endings_structured)
     elif args[1] == 'make':
         with open(args[2], 'r', encoding='utf-8') as f:
             endings_structured = json.load(f)
@@ -198,8 +111,7 @@ def main(args):
                     assert s == '[E]'
         
         output = make_sir0_from_dict(endings_structured, display_encoding)
-        with open(args[3], 'wb') as f:
-            f.write(output)
+        atomic_write.write(args[3], output)
     else:
         print(f'Invalid command "{args[1]}" -- expected "dump" or "make"')
         exit(1)
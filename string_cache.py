@@ -0,0 +1,30 @@
+# Shared cache of encoded strings for all of the .dat writers
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import functools
+
+# The same ids, variable names and character names get written over and over,
+# both within one table and across tables. This is plenty for a whole build
+CACHE_SIZE = 8192
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def encode(s, encoding):
+    # Returns the null-terminated bytes for `s`. bytes are immutable, so it's
+    # safe to hand out the same object to every caller
+    return s.encode(encoding) + b'\0'
+
+def stats():
+    # Returns (hits, lookups) since the process started (or since clear())
+    info = encode.cache_info()
+    return (info.hits, info.hits + info.misses)
+
+def format_stats(hits, lookups):
+    if lookups == 0:
+        return 'encoded-string cache: no lookups'
+    return f'encoded-string cache: {hits}/{lookups} hits ({hits * 100 // lookups}%)'
+
+def clear():
+    encode.cache_clear()
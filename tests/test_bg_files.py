@@ -0,0 +1,100 @@
+# Tests for reading and replacing background images
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+from io import BytesIO
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bg_files
+import raw_image
+
+def make_background(width=64, height=48):
+    # A small uncompressed background, laid out like the game's: SIR0 header,
+    # texture, palette, arrangement, then the main data with the pointers
+    texture = bytes((x // 8 * 3 + y // 8 * 5 + (x ^ y) % 3) % 16 for y in range(height) for x in range(width))
+    palette = b''.join(((i * 0x123) & 0x7FFF).to_bytes(2, 'little') for i in range(256))
+    body = bytearray(b'SIR0' + bytes(12))
+    texture_ptr = len(body)
+    body += texture
+    palette_ptr = len(body)
+    body += palette
+    arrangement_ptr = len(body)
+    body += bytes(range(64))
+    main_data = len(body)
+    for value in (0, 0, width // 8 - 1, height // 8 - 1, 0, 0, texture_ptr, palette_ptr, arrangement_ptr):
+        body += value.to_bytes(4, 'little')
+    body[4:8] = main_data.to_bytes(4, 'little')
+    while len(body) % 16 != 0:
+        body.append(0xAA)
+    body[8:12] = len(body).to_bytes(4, 'little')
+    body += bytes([4, 4, 0])
+    while len(body) % 16 != 0:
+        body.append(0xAA)
+    return bytes(body)
+
+class PxMemoryviewTest(unittest.TestCase):
+    # nitrofs.py and batch.py hand over memoryviews instead of bytes, so
+    # nothing gets copied. Every PX format has to work with those too
+    def setUp(self):
+        self.uncompressed = make_background()
+
+    def test_decompress(self):
+        for fmt in bg_files.PX_FORMATS:
+            with self.subTest(fmt=fmt):
+                compressed = memoryview(bytes(bg_files.px_compress(self.uncompressed, fmt)))
+                self.assertEqual(bytes(bg_files.decompress(compressed)), self.uncompressed)
+                chunks = bg_files.iter_decompress(compressed, 0x100)
+                self.assertEqual(b''.join(bytes(c) for c in chunks), self.uncompressed)
+
+    def test_dump_and_replace(self):
+        for fmt in bg_files.PX_FORMATS:
+            with self.subTest(fmt=fmt):
+                compressed = memoryview(bytes(bg_files.px_compress(self.uncompressed, fmt)))
+                raw = bg_files.dump_raw(compressed)
+                self.assertEqual(raw, bg_files.dump_raw(self.uncompressed))
+                self.assertEqual(bg_files.dump_image(compressed).tobytes(), raw_image.unpack(raw)[3].tobytes())
+
+                new_dat = bg_files.replace_raw(compressed, memoryview(raw))
+                self.assertEqual(bytes(new_dat[0:4]), fmt)
+                self.assertEqual(bytes(bg_files.decompress(new_dat)), self.uncompressed)
+
+                with bg_files.open_png(self._png(compressed)) as image:
+                    new_dat = bg_files.replace_image(compressed, image)
+                self.assertEqual(bytes(bg_files.decompress(new_dat)), self.uncompressed)
+
+    @staticmethod
+    def _png(bg_dat):
+        out = BytesIO()
+        bg_files.dump_image(bg_dat).save(out, format='PNG')
+        return out.getvalue()
+
+class EmptyCompressTest(unittest.TestCase):
+    def test_empty(self):
+        compressor = bg_files.Compressor()
+        compressor.feed(b'')
+        with self.assertRaises(RuntimeError):
+            compressor.finish()
+        with self.assertRaises(RuntimeError):
+            bg_files.at6p_compress(memoryview(b''))
+
+class RawPaletteTest(unittest.TestCase):
+    # A palette that's too big would move everything after it in the .dat
+    def test_too_many_colors(self):
+        bg_dat = make_background()
+        (width, height, palette, pixels) = raw_image.unpack(bg_files.dump_raw(bg_dat))
+        raw = bytearray(raw_image.pack(width, height, palette, pixels))
+        raw[8:10] = (257).to_bytes(2, 'little')
+        raw[raw_image.HEADER_SIZE:raw_image.HEADER_SIZE] = bytes(2)
+        with self.assertRaises(RuntimeError):
+            raw_image.unpack(raw)
+        with self.assertRaises(RuntimeError):
+            bg_files.replace_pixels(bg_dat, width, height, pixels, bytes(palette) + bytes(2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# One command for all of the tools, which only loads the tool that gets used
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import importlib
+import sys
+import time
+
+# Name on the command line -> (module, what it's for). Each tool still parses
+# its own arguments; this just finds the right one and imports it, so running
+# `chara dump` never loads Pillow (or any of the other tools)
+COMMANDS = {
+    'bg': ('bg_files', 'Backgrounds, images, and AT6P/PX compression'),
+    'font': ('font', 'Fonts (kanji*.dat)'),
+    'chara': ('chara', 'Character names (chara.dat)'),
+    'file': ('file', 'File list (file.dat)'),
+    'room': ('room_data', 'Escape rooms (room.dat)'),
+    'camera': ('camera_rooms', 'Room cameras (camera.dat)'),
+    'staff': ('staff_roll', 'Credits (staff.dat)'),
+    'sir0': ('sir0', 'Checking SIR0 files'),
+    'rom': ('nitrofs', 'Reading and patching .nds ROMs'),
+    'bps': ('bps', 'Making and applying BPS patches'),
+    'xref': ('xref', 'Finding where ids and variables are used'),
+    'validate': ('validate', 'Checking edited JSON files'),
+    'watch': ('watch', 'Rebuilding files when they change'),
+    'batch': ('batch', 'Rebuilding everything in a rules file'),
+    'daemon': ('daemon', 'Keeping the tools loaded for other programs'),
+}
+
+def find_command(name):
+    # The module names (like `bg_files` or `bg_files.py`) work too, so the
+    # commands in watch.py rules files can be copied as-is
+    if name.endswith('.py'):
+        name = name[:-3]
+    if name in COMMANDS:
+        return COMMANDS[name][0]
+    for (module, _) in COMMANDS.values():
+        if name == module:
+            return module
+    return None
+
+def describe_modules(names, already_loaded):
+    # Top-level packages only, since Pillow alone is dozens of modules. The
+    # standard library is just counted, since it's the same for every tool
+    new = sorted({n.split('.')[0] for n in names} - {n.split('.')[0] for n in already_loaded})
+    other = [n for n in new if n not in sys.stdlib_module_names]
+    stdlib_count = len(new) - len(other)
+    if stdlib_count != 0:
+        other.append(f'{stdlib_count} standard library modules')
+    return ', '.join(other)
+
+def import_report(module_name, import_ms, run_ms, modules_before, modules_after_import):
+    lines = [f'Imported {module_name} in {import_ms:.1f} ms']
+    loaded = describe_modules(modules_after_import, modules_before)
+    if loaded != '':
+        lines.append(f'    loaded: {loaded}')
+    lines.append(f'Ran in {run_ms:.1f} ms')
+    lazy = describe_modules(sys.modules.keys(), modules_after_import)
+    if lazy != '':
+        lines.append(f'    loaded while running: {lazy}')
+    return '\n'.join(lines)
+
+def print_usage(args):
+    print('Usage:')
+    print(f'    python {args[0]} [--import-time] <tool> <command> [<arguments>...]')
+    print()
+    print('Tools:')
+    for (name, (module, description)) in COMMANDS.items():
+        print(f'    {name:<10}{description} ({module}.py)')
+    print()
+    print(f'Run `python {args[0]} <tool>` to see what commands a tool has.')
+
+def main(args):
+    import_time = False
+    rest = args[1:]
+    while len(rest) != 0 and rest[0].startswith('--'):
+        if rest[0] == '--import-time':
+            import_time = True
+        else:
+            print_usage(args)
+            return 1
+        rest = rest[1:]
+
+    if len(rest) == 0:
+        print_usage(args)
+        return 1
+
+    module_name = find_command(rest[0])
+    if module_name is None:
+        print(f'Unknown tool "{rest[0]}" -- expected one of: {", ".join(COMMANDS.keys())}')
+        return 1
+
+    modules_before = set(sys.modules.keys())
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_ms = (time.perf_counter() - start) * 1000
+    modules_after_import = set(sys.modules.keys())
+
+    # The tools print their usage with args[0], so make that show the whole
+    # command that has to be typed
+    start = time.perf_counter()
+    try:
+        result = module.main([f'{args[0]} {rest[0]}', *rest[1:]])
+    except SystemExit as e:
+        result = e.code
+    run_ms = (time.perf_counter() - start) * 1000
+
+    if import_time:
+        print(import_report(module_name, import_ms, run_ms, modules_before, modules_after_import), file=sys.stderr)
+    return result
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
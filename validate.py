@@ -0,0 +1,174 @@
+# Script to check edited JSON files for text that can't be put back into the game
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import functools
+import json
+import re
+import sys
+
+# Which fields hold text that gets shown to the player, for each tool. Every
+# other string is an id, which always uses Shift-JIS
+DISPLAY_FIELDS = {
+    'chara': ('display_name',),
+    'file': ('title', 'description'),
+    'room_data': ('name',),
+    'camera_rooms': ('topview_name',),
+}
+
+# chara.py and file.py always use Shift-JIS for display strings, so --ptbr and
+# --latin1 only affect these tools
+CONFIGURABLE_ENCODING_TOOLS = ('room_data', 'camera_rooms', 'staff_roll')
+
+TOOLS = ('chara', 'file', 'room_data', 'camera_rooms', 'staff_roll')
+
+# Staff roll commands like [E] aren't drawn with the font
+COMMAND_PATTERN = re.compile(r'\[[^\]]*\]')
+
+def walk(obj, path, display_fields, is_display):
+    if isinstance(obj, str):
+        yield (path, obj, is_display)
+    elif isinstance(obj, dict):
+        for (k, v) in obj.items():
+            yield from walk(v, f'{path}.{k}', display_fields, is_display or k in display_fields)
+    elif isinstance(obj, list):
+        for (i, v) in enumerate(obj):
+            yield from walk(v, f'{path}[{i}]', display_fields, is_display)
+
+def iter_strings(tool, structured):
+    # Yields (JSON path, string, whether it's a display string) for every string
+    # that the tool would write into the .dat file
+    if tool == 'staff_roll':
+        for (k, v) in structured.items():
+            key_path = f'$[{json.dumps(k, ensure_ascii=False)}]'
+            yield (key_path + ' (key)', k, False)
+            yield from walk(v, key_path, (), True)
+    else:
+        yield from walk(structured, '$', DISPLAY_FIELDS[tool], False)
+
+def display_encoding_for(tool, display_encoding):
+    if tool not in CONFIGURABLE_ENCODING_TOOLS or display_encoding is None:
+        return 'mskanji'
+    return display_encoding
+
+@functools.lru_cache(maxsize=None)
+def encode_or_none(s, encoding):
+    try:
+        return s.encode(encoding)
+    except UnicodeEncodeError:
+        return None
+
+@functools.lru_cache(maxsize=None)
+def unencodable_chars(s, encoding):
+    # Only gets called for strings that failed to encode, so checking one
+    # character at a time is fine
+    return tuple(sorted({c for c in s if encode_or_none(c, encoding) is None}, key=s.index))
+
+def split_encoded_chars(encoded, encoding):
+    # Splits an encoded string into the byte sequences that the font looks up
+    if encoding != 'mskanji':
+        return [encoded[i:i+1] for i in range(len(encoded))]
+    chars = []
+    i = 0
+    while i < len(encoded):
+        b = encoded[i]
+        if 0x81 <= b <= 0x9F or 0xE0 <= b <= 0xFC:
+            chars.append(encoded[i:i+2])
+            i += 2
+        else:
+            chars.append(encoded[i:i+1])
+            i += 1
+    return chars
+
+def load_font_codes(kanji_dat):
+    import font
+    return {c.code_bytes for c in font.dump(kanji_dat)['chars']}
+
+class Validator:
+    def __init__(self, display_encoding=None, font_codes=None):
+        self.display_encoding = display_encoding
+        self.font_codes = font_codes
+        self.checked = 0
+        self.problems = []
+        self._missing_glyphs = {}
+
+    def missing_glyphs(self, s, encoding):
+        key = (s, encoding)
+        missing = self._missing_glyphs.get(key)
+        if missing is None:
+            encoded = encode_or_none(COMMAND_PATTERN.sub('', s), encoding)
+            missing = []
+            if encoded is not None:
+                import font
+                for c in split_encoded_chars(encoded, encoding):
+                    # Half-width katakana get drawn with the hiragana glyphs,
+                    # the same way font.py's subset command keeps them
+                    glyph = font.halfwidth_katakana_as_hiragana(c) if encoding == 'mskanji' else None
+                    if (glyph or c) not in self.font_codes and c not in missing:
+                        missing.append(c)
+            self._missing_glyphs[key] = missing
+        return missing
+
+    def check(self, name, tool, structured):
+        display_encoding = display_encoding_for(tool, self.display_encoding)
+        for (path, s, is_display) in iter_strings(tool, structured):
+            self.checked += 1
+            encoding = display_encoding if is_display else 'mskanji'
+            if encode_or_none(s, encoding) is None:
+                bad = ''.join(unencodable_chars(s, encoding))
+                self.problems.append(f'{name} {path}: {s!r} has characters that can\'t be encoded in {encoding}: {bad!r}')
+                continue
+            if is_display and self.font_codes is not None:
+                missing = self.missing_glyphs(s, encoding)
+                if len(missing) != 0:
+                    shown = ', '.join(c.decode(encoding, errors='backslashreplace') + f' ({c.hex()})' for c in missing)
+                    self.problems.append(f'{name} {path}: {s!r} uses characters that aren\'t in the font: {shown}')
+
+def print_usage(args):
+    print('Usage:')
+    print(f'    python {args[0]} <tool> <edited.json> [<tool> <edited.json>...] [--ptbr | --latin1] [--font=<kanji.dat>]')
+    print(f'Valid tools: {", ".join(TOOLS)}')
+
+def main(args):
+    display_encoding = None
+    font_path = None
+    positionals = []
+    for arg in args[1:]:
+        if arg == '--ptbr' or arg == '--latin1':
+            display_encoding = 'latin_1'
+        elif arg.startswith('--font='):
+            font_path = arg[len('--font='):]
+        else:
+            positionals.append(arg)
+
+    if len(positionals) == 0 or len(positionals) % 2 != 0:
+        print_usage(args)
+        return 1
+
+    font_codes = None
+    if font_path is not None:
+        with open(font_path, 'rb') as f:
+            font_codes = load_font_codes(f.read())
+
+    validator = Validator(display_encoding, font_codes)
+    for i in range(0, len(positionals), 2):
+        tool = positionals[i]
+        if tool.endswith('.py'):
+            tool = tool[:-3]
+        if tool not in TOOLS:
+            print(f'Unknown tool "{positionals[i]}"')
+            print_usage(args)
+            return 1
+        with open(positionals[i + 1], 'r', encoding='utf-8') as f:
+            structured = json.load(f)
+        validator.check(positionals[i + 1], tool, structured)
+
+    for problem in validator.problems:
+        print(problem)
+    print(f'Checked {validator.checked} strings, found {len(validator.problems)} problems')
+    return 1 if len(validator.problems) != 0 else 0
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
@@ -0,0 +1,245 @@
+# Script to automatically rebuild .dat files as soon as their JSON/PNG sources change
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import importlib
+import os
+import shlex
+import sys
+import time
+import traceback
+
+import atomic_write
+import string_cache
+
+# Tools that can be used in a rules file. Each one gets imported once, when the
+# watcher starts, so rebuilds don't have to pay for starting Python again
+TOOLS = ('bg_files', 'camera_rooms', 'chara', 'file', 'font', 'room_data', 'staff_roll')
+
+# What each argument (other than the options) of a command is: a file it reads,
+# a file it writes, or something that isn't a path at all
+IN = 'in'
+OUT = 'out'
+WORD = 'word'
+
+# (tool, command) -> (roles of the arguments, roles that repeat after those).
+# Commands that aren't here (like `bg_files.py tile-stats`, which doesn't
+# write anything) can't be used in a rules file
+COMMANDS = {
+    ('bg_files', 'dump-img'): ((IN, OUT), ()),
+    ('bg_files', 'insert-img'): ((IN, IN, OUT), ()),
+    ('bg_files', 'decompress'): ((IN, OUT), ()),
+    ('bg_files', 'compress'): ((IN, OUT), ()),
+    ('bg_files', 'index'): ((IN, OUT), ()),
+    ('font', 'dump'): ((IN, OUT, OUT), ()),
+    ('font', 'make'): ((IN, IN, OUT), ()),
+    # Then any number of "<tool> <edited.json>" pairs
+    ('font', 'subset'): ((IN, IN, OUT), (WORD, IN)),
+    **{(tool, 'dump'): ((IN, OUT), ()) for tool in ('camera_rooms', 'chara', 'file', 'room_data', 'staff_roll')},
+    **{(tool, 'make'): ((IN, OUT), ()) for tool in ('camera_rooms', 'chara', 'file', 'room_data', 'staff_roll')},
+}
+
+# Options whose value is a file that the command reads
+INPUT_OPTIONS = ('--text=',)
+
+class Rule:
+    def __init__(self, line_number, tool, command, positionals, flags):
+        # `positionals` is a list of (role, argument) pairs, with paths
+        # already made relative to the folder watch.py runs in, and so are
+        # the paths in `flags`
+        self.line_number = line_number
+        self.tool = tool
+        self.command = command
+        self.positionals = [arg for (_, arg) in positionals]
+        self.flags = flags
+        self.inputs = [arg for (role, arg) in positionals if role == IN]
+        self.inputs += [flag[len(o):] for flag in flags for o in INPUT_OPTIONS if flag.startswith(o)]
+        self.outputs = [arg for (role, arg) in positionals if role == OUT]
+        # For messages
+        self.name = ', '.join(self.outputs)
+
+    def args(self):
+        return [self.tool + '.py', self.command, *self.positionals, *self.flags]
+
+def argument_roles(command, count):
+    # Returns the role of each of the `count` arguments, or None if that isn't
+    # a number of arguments the command takes
+    (roles, repeated) = command
+    if count < len(roles):
+        return None
+    if len(repeated) == 0:
+        return list(roles) if count == len(roles) else None
+    if (count - len(roles)) % len(repeated) != 0:
+        return None
+    return [*roles, *repeated * ((count - len(roles)) // len(repeated))]
+
+def read_rules(rules_path):
+    # Paths in the rules file are relative to the folder the rules file is in
+    base_dir = os.path.dirname(os.path.abspath(rules_path))
+
+    rules = []
+    with open(rules_path, 'r', encoding='utf-8') as f:
+        for (line_number, line) in enumerate(f, start=1):
+            words = shlex.split(line, comments=True)
+            if len(words) == 0:
+                continue
+            if len(words) < 2:
+                raise ValueError(f'{rules_path}:{line_number}: expected "<tool> <command> <arguments...>"')
+
+            tool = words[0]
+            if tool.endswith('.py'):
+                tool = tool[:-3]
+            if tool not in TOOLS:
+                raise ValueError(f'{rules_path}:{line_number}: unknown tool "{words[0]}"')
+            command = COMMANDS.get((tool, words[1]))
+            if command is None:
+                raise ValueError(f'{rules_path}:{line_number}: "{words[0]} {words[1]}" can\'t be used in a rules file')
+
+            def resolve(path):
+                return os.path.normpath(os.path.join(base_dir, path))
+
+            arguments = [w for w in words[2:] if not w.startswith('--')]
+            roles = argument_roles(command, len(arguments))
+            if roles is None:
+                raise ValueError(f'{rules_path}:{line_number}: wrong number of arguments for "{words[0]} {words[1]}"')
+            positionals = [(role, arg if role == WORD else resolve(arg)) for (role, arg) in zip(roles, arguments)]
+
+            flags = []
+            for w in words[2:]:
+                if not w.startswith('--'):
+                    continue
+                for o in INPUT_OPTIONS:
+                    if w.startswith(o):
+                        w = o + resolve(w[len(o):])
+                flags.append(w)
+
+            rules.append(Rule(line_number, tool, words[1], positionals, flags))
+    return rules
+
+def scan(watched_dirs, watched_paths):
+    # One os.scandir per folder is a lot cheaper than one os.stat per file,
+    # since the folder listing already has most of the stat info cached
+    snapshot = {}
+    for d in watched_dirs:
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.path in watched_paths:
+                        st = entry.stat()
+                        snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            pass
+    return snapshot
+
+def is_out_of_date(rule, snapshot):
+    # Out of date if any output is missing, or older than any input
+    oldest = None
+    for path in rule.outputs:
+        output = snapshot.get(path)
+        if output is None:
+            try:
+                output = (os.stat(path).st_mtime_ns, None)
+            except FileNotFoundError:
+                return True
+        if oldest is None or output[0] < oldest:
+            oldest = output[0]
+    for path in rule.inputs:
+        stamp = snapshot.get(path)
+        if stamp is not None and stamp[0] > oldest:
+            return True
+    return False
+
+def rebuild(rule):
+    module = sys.modules[rule.tool]
+    (hits_before, lookups_before) = string_cache.stats()
+    (_, unchanged_before) = atomic_write.stats()
+    start = time.perf_counter()
+    try:
+        result = module.main(rule.args())
+    except SystemExit as e:
+        result = e.code
+    except Exception:
+        traceback.print_exc()
+        result = 1
+    elapsed = (time.perf_counter() - start) * 1000
+    (hits, lookups) = string_cache.stats()
+    cache_report = string_cache.format_stats(hits - hits_before, lookups - lookups_before)
+
+    if result:
+        print(f'FAILED to rebuild {rule.name} (rule on line {rule.line_number}) after {elapsed:.0f} ms')
+        return False
+    # Files with the same contents don't get rewritten, so nothing after this
+    # in the build thinks they changed
+    (_, unchanged) = atomic_write.stats()
+    if unchanged - unchanged_before >= len(rule.outputs):
+        print(f'Rebuilt {rule.name} in {elapsed:.0f} ms, but it didn\'t change ({cache_report})')
+    else:
+        print(f'Rebuilt {rule.name} in {elapsed:.0f} ms ({cache_report})')
+    return True
+
+def watch(rules, interval, debounce):
+    for tool in sorted({r.tool for r in rules}):
+        importlib.import_module(tool)
+
+    watched_paths = {p for r in rules for p in r.inputs}
+    watched_dirs = {os.path.dirname(p) for p in watched_paths}
+
+    # Start out by bringing everything up to date, like make would
+    snapshot = scan(watched_dirs, watched_paths)
+    for rule in rules:
+        if is_out_of_date(rule, snapshot):
+            rebuild(rule)
+    print(f'Watching {len(watched_paths)} files for changes (Ctrl+C to stop)')
+
+    pending = set()
+    last_change = 0
+    while True:
+        time.sleep(interval)
+        new_snapshot = scan(watched_dirs, watched_paths)
+        changed = {p for p in watched_paths if new_snapshot.get(p) != snapshot.get(p)}
+        snapshot = new_snapshot
+        now = time.monotonic()
+        if len(changed) != 0:
+            pending |= changed
+            last_change = now
+
+        # Wait for a burst of saves to settle down before rebuilding anything
+        if len(pending) != 0 and now - last_change >= debounce:
+            # If one rule's output is another rule's input, the next scan will
+            # notice that the output changed and rebuild the second rule too
+            for rule in rules:
+                if not pending.isdisjoint(rule.inputs):
+                    rebuild(rule)
+            pending.clear()
+
+def print_usage(args):
+    print('Usage:')
+    print(f'    python {args[0]} <rules.txt> [--interval=<seconds>] [--debounce=<seconds>]')
+
+def main(args):
+    if len(args) < 2:
+        print_usage(args)
+        return 1
+
+    interval = 0.1
+    debounce = 0.2
+    for arg in args[2:]:
+        if arg.startswith('--interval='):
+            interval = float(arg[len('--interval='):])
+        elif arg.startswith('--debounce='):
+            debounce = float(arg[len('--debounce='):])
+        else:
+            print_usage(args)
+            return 1
+
+    rules = read_rules(args[1])
+    try:
+        watch(rules, interval, debounce)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
@@ -0,0 +1,186 @@
+# Script to find where ids and variable names are used across the etc/*.dat tables
+# for 999: Nine Hours, Nine Persons, Nine Doors (DS)
+# by PhoenixBound
+# Created: 2026-10-19
+# Last updated: 2026-10-19
+
+import json
+import os
+import sys
+
+import atomic_write
+import camera_rooms
+import chara
+import file
+import records
+import room_data
+import staff_roll
+
+INDEX_VERSION = 2
+
+# Fields that hold the name of a game variable, rather than some other kind of id
+VAR_FIELDS = ('var', 'unlock_var')
+
+# File name in etc/ -> (function that dumps it as a list of records, the table's layout)
+TABLES = {
+    'chara.dat': (lambda data, enc: chara.dump(data), chara.CHARA_TABLE),
+    'file.dat': (lambda data, enc: file.dump(data), file.FILE_TABLE),
+    'room.dat': (room_data.dump, room_data.ROOM_TABLE),
+    'camera.dat': (camera_rooms.dump, camera_rooms.CAMERA_TABLE),
+    'staff.dat': (lambda data, enc: [{'id': k, 'credits': v} for (k, v) in staff_roll.dump(data, enc).items()],
+                  staff_roll.STAFF_TABLE),
+}
+
+def is_word_byte(b):
+    return b == 0x5F or 0x30 <= b <= 0x39 or 0x41 <= b <= 0x5A or 0x61 <= b <= 0x7A
+
+def find_whole_word(data, needle):
+    # Returns the offset of the first copy of `needle` that isn't just part of
+    # a longer name (so that looking for VAR1 doesn't find VAR10)
+    i = data.find(needle)
+    while i != -1:
+        before_ok = i == 0 or not is_word_byte(data[i - 1])
+        after = i + len(needle)
+        after_ok = after == len(data) or not is_word_byte(data[after])
+        if before_ok and after_ok:
+            return i
+        i = data.find(needle, i + 1)
+    return -1
+
+def build_index(etc_dir, display_encoding, scripts_dir=None):
+    sources = {}
+    strings = {}
+
+    for (name, (dump, table)) in TABLES.items():
+        path = os.path.join(etc_dir, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            continue
+
+        st = os.stat(path)
+        sources[path] = [st.st_mtime_ns, st.st_size]
+        # Display strings (names, titles, etc.) are left out on purpose, since
+        # they're the things that get translated
+        for (json_path, field, s, is_display) in records.iter_strings(table.record, dump(data, display_encoding)):
+            if not is_display:
+                strings.setdefault(s, []).append([name, json_path, field])
+
+    if scripts_dir is not None:
+        # Encode every string once, then search each script for all of them
+        needles = [(s, s.encode('mskanji')) for s in strings.keys() if len(s) != 0]
+        for (dirpath, dirnames, filenames) in os.walk(scripts_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                with open(path, 'rb') as f:
+                    data = f.read()
+                st = os.stat(path)
+                sources[path] = [st.st_mtime_ns, st.st_size]
+                for (s, needle) in needles:
+                    offset = find_whole_word(data, needle)
+                    if offset != -1:
+                        strings[s].append([os.path.relpath(path, scripts_dir), f'0x{offset:X}', 'script'])
+
+    return {
+        'version': INDEX_VERSION,
+        'display_encoding': display_encoding,
+        'sources': sources,
+        'strings': strings,
+    }
+
+def load_index(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get('version') != INDEX_VERSION:
+        raise RuntimeError(f'Index file "{path}" was made by a different version of this script -- please rebuild it')
+
+    # Let people know if the files changed since the index was built, but don't
+    # re-scan anything, since the whole point is for queries to be fast
+    for (source, (mtime, size)) in index['sources'].items():
+        try:
+            st = os.stat(source)
+        except FileNotFoundError:
+            print(f'WARNING: "{source}" no longer exists -- the index may be out of date')
+            continue
+        if st.st_mtime_ns != mtime or st.st_size != size:
+            print(f'WARNING: "{source}" changed since the index was built -- the index may be out of date')
+    return index
+
+def where(index, s):
+    return index['strings'].get(s, [])
+
+def unused_vars(index):
+    # A variable is "unused" if nothing refers to it except for the tables'
+    # own var fields
+    unused = []
+    for (s, uses) in index['strings'].items():
+        if any(field in VAR_FIELDS for (_, _, field) in uses) and \
+           all(field in VAR_FIELDS for (_, _, field) in uses):
+            unused.append(s)
+    unused.sort()
+    return unused
+
+def print_usage(args):
+    print('Usage:')
+    print(f'    python {args[0]} build <etc-folder> <index.json> [--scripts=<scripts-folder>] [--ptbr]')
+    print(f'    python {args[0]} where <index.json> <id-or-var>')
+    print(f'    python {args[0]} unused-vars <index.json>')
+
+def main(args):
+    if len(args) >= 2 and args[1] == 'build':
+        if len(args) < 4:
+            print_usage(args)
+            return 1
+
+        display_encoding = None
+        scripts_dir = None
+        for arg in args[4:]:
+            if arg == '--ptbr':
+                display_encoding = 'latin_1'
+            elif arg.startswith('--scripts='):
+                scripts_dir = arg[len('--scripts='):]
+            else:
+                print_usage(args)
+                return 1
+
+        index = build_index(args[2], display_encoding, scripts_dir)
+        if len(index['sources']) == 0:
+            print(f'No tables found in "{args[2]}"')
+            return 1
+
+        atomic_write.write_json(args[3], index, indent=None)
+    elif len(args) >= 2 and args[1] == 'where':
+        if len(args) != 4:
+            print_usage(args)
+            return 1
+
+        uses = where(load_index(args[2]), args[3])
+        if len(uses) == 0:
+            print(f'"{args[3]}" is not used anywhere')
+            return 1
+        for (source, location, field) in uses:
+            if field == 'script':
+                print(f'{source} at {location}')
+            else:
+                print(f'{source} {location}')
+    elif len(args) >= 2 and args[1] == 'unused-vars':
+        if len(args) != 3:
+            print_usage(args)
+            return 1
+
+        index = load_index(args[2])
+        if not any(field == 'script' for uses in index['strings'].values() for (_, _, field) in uses):
+            print('WARNING: the index was built without --scripts, so every variable will look unused')
+        for s in unused_vars(index):
+            print(s)
+    else:
+        if len(args) == 1:
+            print_usage(args)
+            return 1
+        print(f'Invalid command "{args[1]}" -- expected "build," "where," or "unused-vars"')
+        return 1
+
+if __name__ == '__main__':
+    exit(main(sys.argv))